@@ -0,0 +1,171 @@
+import numpy as np
+
+PREU_BATERIA_KWH = 500.0 # €/kWh instal·lat
+
+# Màxim d'elements (configuracions x mostres) que processem de cop; limita la memòria
+MAX_ELEMENTS = 2**23
+
+
+def _recorrer_blocs(a, minim, maxim, E):
+    '''Estat de càrrega amb E_{t+1} = clip(E_t + a_t, minim, maxim), per blocs.
+
+    a té forma (..., nb, b): nb blocs consecutius de b mostres. La composició de
+    funcions clip(E + A, L, H) torna a ser-ho, així que:
+      1. plegem cada bloc en una sola funció (A, L, H), tots els blocs alhora;
+      2. encadenem els blocs amb l'estat inicial E (nb passos);
+      3. tornem a recórrer cada bloc des del seu estat d'entrada per saber
+         quanta energia entra i surt de la bateria.
+    Són b + nb + b passos vectoritzats en lloc d'un per mostra.
+    Retorna (E final, kWh emmagatzemats, kWh extrets)'''
+    nb, b = a.shape[-2:]
+    A = np.zeros(a.shape[:-1])
+    L = np.broadcast_to(minim, A.shape).copy()
+    H = np.broadcast_to(maxim, A.shape).copy()
+    for t in range(b):
+        a_t = a[..., t]
+        A += a_t
+        np.clip(L + a_t, minim, maxim, out=L)
+        np.clip(H + a_t, minim, maxim, out=H)
+
+    E_entrada = np.empty(A.shape)
+    for k in range(nb):
+        E_entrada[..., k] = E
+        E = np.clip(E + A[..., k], L[..., k], H[..., k])
+
+    emmagatzemat = np.zeros(A.shape)
+    extret = np.zeros(A.shape)
+    E_bloc = E_entrada
+    for t in range(b):
+        E_nou = np.clip(E_bloc + a[..., t], minim, maxim)
+        delta = E_nou - E_bloc
+        emmagatzemat += np.maximum(delta, 0)
+        extret += np.maximum(-delta, 0)
+        E_bloc = E_nou
+    return E, emmagatzemat.sum(axis=-1), extret.sum(axis=-1)
+
+
+def _trams_mateix_signe(net_W, potencia_W, eficiencia_carrega, eficiencia_descarrega, dt_h):
+    '''Variació d'energia desitjada (B, R) sumada per trams consecutius en què la
+    bateria només carrega o només descarrega. Dos passos del mateix signe es
+    componen exactament en un: min(min(E + a1, H) + a2, H) = min(E + a1 + a2, H)
+    (i igual amb el mínim), i l'energia que entra o surt és la mateixa.
+    net_W: (n,) generació - consum d'una configuració de panells'''
+    carrega = net_W > 0
+    inicis = np.flatnonzero(np.diff(carrega, prepend=not carrega[0]))
+    suma = np.add.reduceat(np.minimum(np.abs(net_W), potencia_W[:, None]), inicis, axis=-1)
+    return np.where(carrega[inicis], suma * eficiencia_carrega, -suma / eficiencia_descarrega) * dt_h / 1000
+
+
+def simular_bateria(generacio_W, consum_W, capacitats_kWh, potencia_kW=None,
+                    eficiencia=0.9, soc_minim=0.1, dt_h=10/60, mida_bloc=None):
+    '''Balanç energètic amb bateria per a una graella de configuracions.
+
+    generacio_W: array (..., T) de potència generada (p.ex. (panells, T))
+    consum_W: array (T,) de consum
+    capacitats_kWh: array (B,) de capacitats de bateria
+    potencia_kW: potència màxima de càrrega/descàrrega per bateria (per defecte
+    capacitat / 2 h, una bateria típica de 2 hores)
+    eficiencia: rendiment d'anada i tornada (es reparteix a parts iguals entre càrrega i descàrrega)
+    soc_minim: fracció de la capacitat que no es descarrega mai
+    mida_bloc: passos per bloc del recorregut (per defecte ~arrel dels passos de cada tram)
+
+    Processem l'any per trams per no passar de MAX_ELEMENTS per array. A cada tram
+    ajuntem les mostres consecutives del mateix signe (veure _trams_mateix_signe),
+    que passen de T a uns pocs passos per dia, i recorrem el resultat per blocs
+    (veure _recorrer_blocs).
+    Retorna un diccionari d'arrays amb forma (..., B) en kWh/any i cicles equivalents'''
+    generacio_W = np.asarray(generacio_W, dtype=float)
+    consum_W = np.asarray(consum_W, dtype=float)
+    capacitats_kWh = np.atleast_1d(np.asarray(capacitats_kWh, dtype=float))
+    if potencia_kW is None:
+        potencia_kW = capacitats_kWh / 2
+    potencia_W = np.broadcast_to(np.asarray(potencia_kW, dtype=float) * 1000, capacitats_kWh.shape)
+
+    eficiencia_carrega = eficiencia_descarrega = np.sqrt(eficiencia)
+    E_min = capacitats_kWh * soc_minim
+    E_max = capacitats_kWh
+
+    num_mostres = generacio_W.shape[-1]
+    forma = generacio_W.shape[:-1] + capacitats_kWh.shape
+    configuracions = int(np.prod(forma))
+    mida_tram = max(1, MAX_ELEMENTS // configuracions)
+    files = generacio_W.reshape(-1, num_mostres)
+
+    E = np.broadcast_to(E_min, forma).copy() # comencem amb la bateria al mínim
+    emmagatzemat = np.zeros(forma) # kWh que entren a la bateria
+    extret = np.zeros(forma) # kWh que surten de la bateria
+    kwh_excedent = np.zeros(generacio_W.shape[:-1])
+    kwh_deficit = np.zeros(generacio_W.shape[:-1])
+    kwh_directe = np.zeros(generacio_W.shape[:-1])
+
+    for inici in range(0, num_mostres, mida_tram):
+        tram = slice(inici, inici + mida_tram)
+        net_W = generacio_W[..., tram] - consum_W[tram]
+        excedent_W = np.maximum(net_W, 0)
+        deficit_W = np.maximum(-net_W, 0)
+        kwh_excedent += excedent_W.sum(axis=-1) * dt_h / 1000
+        kwh_deficit += deficit_W.sum(axis=-1) * dt_h / 1000
+        kwh_directe += np.minimum(generacio_W[..., tram], consum_W[tram]).sum(axis=-1) * dt_h / 1000
+
+        # Variació d'energia emmagatzemada que voldríem (..., B, passos), limitada per la potència
+        # i sumada per trams del mateix signe; les files amb menys trams s'omplen amb zeros
+        passos = [_trams_mateix_signe(fila[tram] - consum_W[tram], potencia_W, eficiencia_carrega,
+                                      eficiencia_descarrega, dt_h) for fila in files]
+        a = np.zeros((len(files), len(capacitats_kWh), max(pas.shape[-1] for pas in passos)))
+        for fila, pas in zip(a, passos):
+            fila[:, :pas.shape[-1]] = pas
+        a = a.reshape(forma + a.shape[-1:])
+
+        # Omplim l'últim bloc amb zeros (no canvien l'estat) i separem en blocs
+        b = mida_bloc or max(1, int(np.sqrt(a.shape[-1])))
+        falten = -a.shape[-1] % b
+        if falten:
+            a = np.concatenate([a, np.zeros(a.shape[:-1] + (falten,))], axis=-1)
+        a = a.reshape(a.shape[:-1] + (-1, b))
+
+        E, entra, surt = _recorrer_blocs(a, E_min[:, None], E_max[:, None], E)
+        emmagatzemat += entra
+        extret += surt
+
+    kwh_carregat = emmagatzemat / eficiencia_carrega # excedent que va a la bateria
+    kwh_lliurat = extret * eficiencia_descarrega # consum cobert per la bateria
+    kwh_autoconsum = kwh_directe[..., None] + kwh_lliurat
+    kwh_consum = kwh_directe + kwh_deficit
+    capacitat_util = E_max - E_min
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cicles = np.where(capacitat_util > 0, extret / capacitat_util, 0.0)
+
+    return {
+        'capacitat_kWh': capacitats_kWh,
+        'kwh_autoconsum': kwh_autoconsum,
+        'kwh_importat': kwh_deficit[..., None] - kwh_lliurat,
+        'kwh_exportat': kwh_excedent[..., None] - kwh_carregat,
+        'kwh_lliurat_bateria': kwh_lliurat,
+        'cicles': cicles,
+        'autoconsum_percent': kwh_autoconsum / kwh_consum[..., None] * 100,
+    }
+
+
+if __name__ == '__main__':
+    import time
+    from optimitzacio_panells import (altures_any, perfil_generacio_unitari, CONSUM_ANUAL_LLAR,
+                                      PREU_COMPRA_XARXA, PREU_VENDA_EXCEDENT, PREU_PANELL, VIDA_UTIL)
+
+    azimuts, altures = altures_any()
+    generacio_unitaria = perfil_generacio_unitari(altures)
+    consum_W = np.full(generacio_unitaria.size, CONSUM_ANUAL_LLAR * 1000 / (365 * 24))
+
+    panells = np.arange(1, 16)
+    capacitats = np.arange(0, 20) # kWh
+    inici = time.perf_counter()
+    resultat = simular_bateria(panells[:, None] * generacio_unitaria, consum_W, capacitats)
+    temps = time.perf_counter() - inici
+
+    flux_caixa_anual = (resultat['kwh_autoconsum'] * PREU_COMPRA_XARXA
+                        + resultat['kwh_exportat'] * PREU_VENDA_EXCEDENT)
+    inversio = panells[:, None] * PREU_PANELL + capacitats[None, :] * PREU_BATERIA_KWH
+    benefici = flux_caixa_anual * VIDA_UTIL - inversio
+    i, j = np.unravel_index(np.argmax(benefici), benefici.shape)
+    print(f"Graella {len(panells)}x{len(capacitats)} simulada en {temps:.2f} s")
+    print(f"Òptim: {panells[i]} panells i {capacitats[j]} kWh de bateria -> {benefici[i, j]:.0f} € "
+          f"(autoconsum {resultat['autoconsum_percent'][i, j]:.1f}%, {resultat['cicles'][i, j]:.0f} cicles/any)")
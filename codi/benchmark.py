@@ -0,0 +1,157 @@
+import os
+os.environ.setdefault('MPLBACKEND', 'Agg')  # sense pantalla: cap mòdul ha d'obrir finestres
+
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import tracemalloc
+import numpy as np
+
+DIR_BENCHMARKS = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+FITXER_REFERENCIA = os.path.join(DIR_BENCHMARKS, 'referencia.json')
+
+# Un cas és més lent que la referència si temps > TOLERANCIA * temps_referencia + MARGE_S
+# (el marge evita falses alarmes en els casos de pocs mil·lisegons)
+TOLERANCIA = 1.5
+MARGE_S = 0.005
+
+
+def mesurar(funcio, repeticions=3):
+    '''Executa funcio() unes quantes vegades. Retorna el millor temps (s) i el
+    pic de memòria (MB) d'una execució, mesurat a part amb tracemalloc'''
+    temps = []
+    for _ in range(repeticions):
+        inici = time.perf_counter()
+        funcio()
+        temps.append(time.perf_counter() - inici)
+    tracemalloc.start()
+    funcio()
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(temps), pic / 2**20
+
+
+# --- Casos --- #
+# Cada cas prepara les dades fora del temps mesurat i retorna (funció, unitats per crida, nom de la unitat)
+
+def cas_posiciosol_escalar():
+    from func_canvibase import posiciosol
+    from efemerides import EfemeridesTerra
+    efemerides = EfemeridesTerra()
+    instants = np.datetime64('2026-06-21T00:00') + np.arange(0, 1440, 10).astype('timedelta64[m]')
+    vectors = efemerides.posicio(instants)
+    dates = [datetime.datetime(2026, 6, 21) + datetime.timedelta(minutes=int(m)) for m in range(0, 1440, 10)]
+    def funcio():
+        for vector, data in zip(vectors, dates):
+            posiciosol(vector, data)
+    return funcio, len(dates), 'crides'
+
+
+def cas_posiciosol_vectoritzat():
+    from func_canvibase import posiciosol_vectoritzat
+    from efemerides import EfemeridesTerra
+    efemerides = EfemeridesTerra()
+    instants = np.datetime64('2026-01-01T00:00') + np.arange(0, 365 * 1440, 10).astype('timedelta64[m]')
+    vectors = efemerides.posicio(instants)
+    return (lambda: posiciosol_vectoritzat(vectors, instants)), len(instants), 'posicions'
+
+
+def cas_orbita():
+    from trajectoria import calcular_orbita
+    return (lambda: calcular_orbita(usar_cache=False)), 1, 'òrbites'
+
+
+def _cas_simulacio(resolucio):
+    def cas():
+        from energiagenerada import simular_any
+        from efemerides import EfemeridesTerra
+        efemerides = EfemeridesTerra()
+        return (lambda: simular_any(resolucio, efemerides=efemerides)), 1, 'anys'
+    return cas
+
+
+def cas_escombrat_panells():
+    from optimitzacio_panells import altures_any, perfil_generacio_unitari, escombrat_panells
+    _, altures = altures_any()
+    generacio_unitaria = perfil_generacio_unitari(altures)
+    consums = np.linspace(1500, 8000, 50)
+    preus_compra = np.linspace(0.10, 0.35, 20)
+    return (lambda: escombrat_panells(generacio_unitaria, range(1, 31), consums, preus_compra)), 1, 'escombrats'
+
+
+CASOS = {
+    'posiciosol_escalar': cas_posiciosol_escalar,
+    'posiciosol_vectoritzat': cas_posiciosol_vectoritzat,
+    'orbita_rk4': cas_orbita,
+    'simulacio_any_10min': _cas_simulacio(10),
+    'simulacio_any_1min': _cas_simulacio(1),
+    'escombrat_panells': cas_escombrat_panells,
+}
+
+
+def executar(noms=None, repeticions=3):
+    '''Executa els casos demanats (tots per defecte) i retorna el diccionari de resultats'''
+    resultats = {}
+    for nom in noms or CASOS:
+        funcio, unitats, unitat = CASOS[nom]()
+        funcio() # escalfem (imports, memòria cau d'efemèrides...)
+        temps, memoria = mesurar(funcio, repeticions)
+        resultats[nom] = {
+            'temps_s': temps,
+            'rendiment': unitats / temps,
+            'unitat': f'{unitat}/s',
+            'pic_memoria_MB': memoria,
+        }
+    return {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'maquina': {'python': platform.python_version(), 'numpy': np.__version__,
+                    'sistema': platform.platform(), 'processador': platform.processor()},
+        'casos': resultats,
+    }
+
+
+def comparar(resultats, referencia, tolerancia=TOLERANCIA):
+    '''Llista de (cas, temps, temps_referencia) dels casos més lents que la referència'''
+    regressions = []
+    for nom, cas in resultats['casos'].items():
+        if nom in referencia['casos']:
+            temps_referencia = referencia['casos'][nom]['temps_s']
+            if cas['temps_s'] > tolerancia * temps_referencia + MARGE_S:
+                regressions.append((nom, cas['temps_s'], temps_referencia))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks de posició solar, energia anual i optimització")
+    parser.add_argument('--casos', nargs='+', choices=list(CASOS), help="per defecte, tots")
+    parser.add_argument('--repeticions', type=int, default=3)
+    parser.add_argument('--sortida', default=os.path.join(DIR_BENCHMARKS, 'resultats.json'))
+    parser.add_argument('--referencia', default=FITXER_REFERENCIA)
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    parser.add_argument('--desar-referencia', action='store_true',
+                        help="desa aquests resultats com a nova referència")
+    args = parser.parse_args()
+
+    resultats = executar(args.casos, args.repeticions)
+    for nom, cas in resultats['casos'].items():
+        print(f"{nom:24s} {cas['temps_s'] * 1000:10.1f} ms {cas['rendiment']:14.1f} {cas['unitat']:14s} "
+              f"{cas['pic_memoria_MB']:8.1f} MB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.sortida)), exist_ok=True)
+    with open(args.sortida, 'w', encoding='utf-8') as f:
+        json.dump(resultats, f, indent=2, ensure_ascii=False)
+    if args.desar_referencia:
+        with open(args.referencia, 'w', encoding='utf-8') as f:
+            json.dump(resultats, f, indent=2, ensure_ascii=False)
+        print(f"Referència desada a {args.referencia}")
+    elif os.path.exists(args.referencia):
+        with open(args.referencia, encoding='utf-8') as f:
+            regressions = comparar(resultats, json.load(f), args.tolerancia)
+        for nom, temps, temps_referencia in regressions:
+            print(f"REGRESSIÓ {nom}: {temps * 1000:.1f} ms (referència {temps_referencia * 1000:.1f} ms)",
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,123 @@
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import trajectoria
+from func_canvibase import OBLIQUITAT, LONGITUT_PERIHELI
+from efemerides import EfemeridesTerra, DIA_PERIHELI
+from zona_horaria import local_a_utc
+from llum_dia import coordenades_emplacament, sortida_posta, posiciosol_dia, usar_mascara_dia
+from instrumentacio import instrumentar
+
+# La geometria solar d'un emplaçament, un any i una resolució no canvia mai:
+# la guardem a disc (.npy que llegim amb memmap) i en una LRU dins del procés
+DIR_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache', 'posicio_solar')
+MIDA_LRU = 8 # graelles que guardem en memòria
+VERSIO = 3 # canviar-la si canvia el càlcul (invalida tota la cache de disc)
+
+_lru = OrderedDict()
+_estadistiques = {'encerts_memoria': 0, 'encerts_disc': 0, 'fallades': 0}
+
+
+def clau(lat, lon, zona, dia_inici, numdies, resolucio, nomes_dia):
+    '''Hash de tot el que determina la graella: emplaçament, dies, resolució i
+    constants del model (obliqüitat, longitud del periheli, òrbita)'''
+    parametres = (VERSIO, round(float(lat), 6), round(float(lon), 6), zona,
+                  str(np.datetime64(dia_inici, 'D')), int(numdies), int(resolucio), bool(nomes_dia),
+                  OBLIQUITAT, LONGITUT_PERIHELI, str(DIA_PERIHELI), trajectoria._clau_cache(1.0, 1))
+    return hashlib.sha1(repr(parametres).encode()).hexdigest()[:16]
+
+
+def _calcular(dia_inici, numdies, resolucio, emplacament, nomes_dia):
+    # Mateix càlcul que fan simular_any i altures_any sense cache
+    efemerides = EfemeridesTerra()
+    dies = np.datetime64(dia_inici, 'D') + np.arange(numdies)
+    minuts = np.arange(0, 24 * 60, resolucio)
+    lat, lon, zona = coordenades_emplacament(emplacament)
+    dates_utc = local_a_utc(dies[:, None] + minuts.astype('timedelta64[m]'), zona)
+    llum = sortida_posta(dies, emplacament, efemerides) if nomes_dia else None
+    azimuts, altures = posiciosol_dia(efemerides.posicio, dates_utc, llum, lat, lon)
+    arrays = {'azimuts': azimuts, 'altures': altures}
+    if llum is not None:
+        arrays['durada_hores'] = llum['durada_hores']
+    return arrays
+
+
+def _fitxers(clau_graella):
+    return {nom: os.path.join(DIR_CACHE, f'{clau_graella}_{nom}.npy')
+            for nom in ('azimuts', 'altures', 'durada_hores')}
+
+
+@instrumentar()
+def posicions(dia_inici, numdies, resolucio=10, emplacament=None, nomes_dia=None, usar_cache=True):
+    '''Azimut i alçada (arrays dia x instant local, de només lectura) i, si
+    nomes_dia, la durada del dia (hores), amb l'efemèride per defecte.
+    nomes_dia=None: la màscara de dia només a les resolucions on surt a compte.
+    Busca primer a la LRU, després a disc i si no hi és ho calcula i ho desa.
+    Retorna un diccionari amb 'azimuts', 'altures' i potser 'durada_hores' '''
+    nomes_dia = usar_mascara_dia(nomes_dia, resolucio)
+    if not usar_cache:
+        return _calcular(dia_inici, numdies, resolucio, emplacament, nomes_dia)
+
+    lat, lon, zona = coordenades_emplacament(emplacament)
+    clau_graella = clau(lat, lon, zona, dia_inici, numdies, resolucio, nomes_dia)
+    if clau_graella in _lru:
+        _estadistiques['encerts_memoria'] += 1
+        _lru.move_to_end(clau_graella)
+        return _lru[clau_graella]
+
+    fitxers = _fitxers(clau_graella)
+    if os.path.exists(fitxers['altures']):
+        _estadistiques['encerts_disc'] += 1
+        arrays = {nom: np.load(fitxer, mmap_mode='r') for nom, fitxer in fitxers.items()
+                  if os.path.exists(fitxer)}
+    else:
+        _estadistiques['fallades'] += 1
+        arrays = _calcular(dia_inici, numdies, resolucio, emplacament, nomes_dia)
+        os.makedirs(DIR_CACHE, exist_ok=True)
+        # Escrivim primer a un temporal i el reanomenem, perquè un altre procés
+        # no llegeixi mai un fitxer a mitges; les altures van les últimes perquè
+        # són les que marquen que l'entrada és completa
+        for nom in sorted(arrays, key=lambda nom: nom == 'altures'):
+            temporal = f'{fitxers[nom]}.{os.getpid()}.tmp.npy'
+            np.save(temporal, arrays[nom])
+            os.replace(temporal, fitxers[nom])
+        for array in arrays.values():
+            array.flags.writeable = False
+
+    _lru[clau_graella] = arrays
+    if len(_lru) > MIDA_LRU:
+        _lru.popitem(last=False)
+    return arrays
+
+
+def estadistiques():
+    '''Encerts (memòria i disc) i fallades de la cache des de l'inici del procés'''
+    consultes = sum(_estadistiques.values())
+    encerts = _estadistiques['encerts_memoria'] + _estadistiques['encerts_disc']
+    return dict(_estadistiques, consultes=consultes,
+                taxa_encerts=encerts / consultes if consultes else 0.0)
+
+
+def buidar(disc=False):
+    '''Buida la LRU (i, si disc, també els fitxers) i reinicia les estadístiques'''
+    _lru.clear()
+    for nom in _estadistiques:
+        _estadistiques[nom] = 0
+    if disc and os.path.isdir(DIR_CACHE):
+        for fitxer in os.listdir(DIR_CACHE):
+            if fitxer.endswith('.npy'):
+                os.remove(os.path.join(DIR_CACHE, fitxer))
+
+
+if __name__ == '__main__':
+    import time
+    for intent in ('fred', 'disc', 'memòria'):
+        if intent == 'fred':
+            buidar(disc=True) # sense cap fitxer: mesura el càlcul, no una lectura de disc
+        elif intent == 'disc':
+            _lru.clear()
+        inici = time.perf_counter()
+        posicions('2026-01-01', 365, 10)
+        print(f"{intent:8s}: {(time.perf_counter() - inici) * 1000:8.2f} ms")
+    print(estadistiques())
@@ -0,0 +1,103 @@
+import numpy as np
+from func_canvibase import posiciosol_vectoritzat
+from efemerides import EfemeridesTerra
+from dades_pvgis import carregar_pvgis
+
+CONSTANT_SOLAR = 1362.0 # W/m^2
+
+# Dia representatiu de cada mes (Klein, 1977): la declinació d'aquest dia és la mitjana del mes
+DIES_REPRESENTATIUS = np.array([17, 16, 16, 15, 15, 11, 17, 16, 15, 15, 14, 10])
+
+
+def massa_aire(altures):
+    '''Massa d'aire relativa (Kasten i Young, 1989) per a alçades en graus.
+    Sota l'horitzó retorna infinit (no arriba radiació directa)'''
+    altures = np.asarray(altures, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        am = 1.0 / (np.sin(np.radians(altures)) + 0.50572 * (altures + 6.07995) ** -1.6364)
+    return np.where(altures > 0, am, np.inf)
+
+
+def factor_atmosferic(altures, mesos, transmitancia):
+    '''Fracció de la irradiància extraterrestre que arriba a terra: tau_mes ^ massa_aire.
+    mesos (0-11) ha de tenir la mateixa forma que altures (o ser-hi compatible)'''
+    return np.asarray(transmitancia)[mesos] ** massa_aire(altures)
+
+
+def altures_dies_representatius(any_=2026, efemerides=None):
+    '''Alçada del sol (12, 24) a cada hora UTC del dia representatiu de cada mes'''
+    if efemerides is None:
+        efemerides = EfemeridesTerra()
+    mesos = np.arange(f'{any_}-01', f'{any_ + 1}-01', dtype='datetime64[M]')
+    dies = mesos.astype('datetime64[D]') + (DIES_REPRESENTATIUS - 1)
+    dates_utc = dies[:, None] + np.arange(24).astype('timedelta64[h]')
+    _, altures = posiciosol_vectoritzat(efemerides.posicio(dates_utc), dates_utc)
+    return altures
+
+
+def _metriques(model, mesurat):
+    # RMSE i biaix per mes (W/m^2), sobre les 24 hores
+    error = model - mesurat
+    return np.sqrt(np.mean(error**2, axis=1)), np.mean(error, axis=1)
+
+
+def calibrar(pvgis=None, altures=None):
+    '''Compara el model de cel clar (CONSTANT_SOLAR * sin(alt)) amb els perfils PVGIS
+    per hora UTC i ajusta una transmitància atmosfèrica per mes, per mínims quadrats
+    sobre totes les dades alhora.
+    Retorna un diccionari amb 'transmitancia' (12,), les irradiàncies (12, 24)
+    i el RMSE/biaix mensual abans i després de calibrar'''
+    if pvgis is None:
+        pvgis = carregar_pvgis()
+    if altures is None:
+        altures = altures_dies_representatius()
+    G = pvgis['G']
+
+    sin_alt = np.where(altures > 0, np.sin(np.radians(altures)), 0.0)
+    model = CONSTANT_SOLAR * sin_alt
+    am = massa_aire(altures)
+    mesos = np.repeat(np.arange(12)[:, None], 24, axis=1)
+
+    def residus(transmitancia):
+        return (model * transmitancia[mesos] ** am - G).ravel()
+
+    from scipy.optimize import least_squares
+    ajust = least_squares(residus, x0=np.full(12, 0.7), bounds=(0.0, 1.0))
+    transmitancia = ajust.x
+    calibrat = model * factor_atmosferic(altures, mesos, transmitancia)
+
+    rmse_model, biaix_model = _metriques(model, G)
+    rmse_calibrat, biaix_calibrat = _metriques(calibrat, G)
+    return {
+        'transmitancia': transmitancia,
+        'model': model,
+        'calibrat': calibrat,
+        'pvgis': G,
+        'rmse_model': rmse_model,
+        'biaix_model': biaix_model,
+        'rmse_calibrat': rmse_calibrat,
+        'biaix_calibrat': biaix_calibrat,
+    }
+
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    resultat = calibrar()
+    print(" Mes  tau    RMSE model  biaix model  RMSE calibrat  biaix calibrat  (W/m^2)")
+    for mes in range(12):
+        print(f"{mes + 1:4d}  {resultat['transmitancia'][mes]:.3f}  {resultat['rmse_model'][mes]:10.1f}"
+              f"  {resultat['biaix_model'][mes]:11.1f}  {resultat['rmse_calibrat'][mes]:13.1f}"
+              f"  {resultat['biaix_calibrat'][mes]:14.1f}")
+
+    fig, eixos = plt.subplots(3, 4, figsize=(16, 9), sharex=True, sharey=True)
+    for mes, eix in enumerate(eixos.ravel()):
+        eix.plot(resultat['pvgis'][mes], 'k.', label='PVGIS')
+        eix.plot(resultat['model'][mes], '--', label='Model')
+        eix.plot(resultat['calibrat'][mes], '-', label='Calibrat')
+        eix.set_title(f'Mes {mes + 1}')
+    eixos[0, 0].legend()
+    fig.supxlabel('Hora (UTC)')
+    fig.supylabel('Irradiància (W/m^2)')
+    plt.tight_layout()
+    plt.savefig('figures/calibracio_pvgis.png', bbox_inches='tight')
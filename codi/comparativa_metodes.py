@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
 #constants físiques i normalització
 G = 6.67e-11
@@ -22,9 +21,17 @@ Y_inicial = np.array([theta0, r0, v0])
 
 #pas temporal (h)
 #per veure bé els errors dels mètodes dolents, potser caldria un h més petit ???
-#mantindrem l'original per comparar honestament.
+#mantindrem l'original per comparar honestament (i a part fem l'estudi de convergència).
 h = 3600 * 24 * v_per / r_per 
 
+#conversió de segons a temps adimensional
+SEGONS_A_ADIM = v_per / r_per
+
+#passos de l'estudi de convergència (s): cada pas fi són més iteracions del bucle,
+#per sota de 1e3 s els ordres ja no canvien i el temps es multiplica (100 s triga ~10 vegades més)
+PAS_MINIM = 1e3
+PAS_MAXIM = 1e7
+
 #equacions
 def derivades(t, Y):
     #calcula les derivades dtheta, dr, dv
@@ -78,89 +85,163 @@ def pas_rk4(f, t, Y, h):
     k4 = f(t + h, Y + h * k3)
     return Y + h/6 * (k1 + 2*k2 + 2*k3 + k4)
 
-#bucle de simulació
-#preparem les dades per a cada mètode
-E0 = calcular_energia(Y_inicial)
-metodes = {
-    "Euler Explícit": {
-        "func": pas_euler_explicit, "Y": Y_inicial.copy(), 
-        "t": [], "x": [], "y": [], "error": [], # <--- AFEGIT "error": []
-        "color": "red", "style": "--"
-    },
-    "Euler Semi-Implícit": {
-        "func": pas_euler_semi_implicit, "Y": Y_inicial.copy(), 
-        "t": [], "x": [], "y": [], "error": [], # <--- AFEGIT "error": []
-        "color": "green", "style": "-."
-    },
-    "RK4 (Referència)": {
-        "func": pas_rk4, "Y": Y_inicial.copy(), 
-        "t": [], "x": [], "y": [], "error": [], # <--- AFEGIT "error": []
-        "color": "blue", "style": "-"
-    }
+#mètodes a comparar: tots amb la forma pas(t, Y, h)
+METODES = {
+    "Euler Explícit": {"pas": lambda t, Y, h: pas_euler_explicit(derivades, t, Y, h),
+                       "color": "red", "style": "--"},
+    "Euler Semi-Implícit": {"pas": pas_euler_semi_implicit,
+                            "color": "green", "style": "-."},
+    "RK4 (Referència)": {"pas": lambda t, Y, h: pas_rk4(derivades, t, Y, h),
+                         "color": "blue", "style": "-"},
 }
 
-#simulem una mica més d'un any (per veure si l'òrbita es tanca)
-simulacio_dies = 400
-t_total_adim = simulacio_dies * (24*3600) * (v_per/r_per) #conversió dies -> adimensional
 
-#bucle principal
-t_actual = 0
-while t_actual < t_total_adim:
-    
-    for nom, dades in metodes.items():
-        #guardem posició actual (convertida a UA i cartesiana)
-        theta_i, r_i, v_i = dades["Y"]
-        
-        #conversió a coordenades cartesianes i UA per pintar
-        r_real = r_i * r_per / UA
-        x_i = r_real * np.cos(theta_i)
-        y_i = r_real * np.sin(theta_i)
-        
-        dades["x"].append(x_i)
-        dades["y"].append(y_i)
-        dades["t"].append(t_actual)
-        
-        #CÀLCUL DE L'ERROR D'ENERGIA
-        E_actual = calcular_energia(dades["Y"])
-        error_relatiu = abs((E_actual - E0) / E0)
-        dades["error"].append(error_relatiu)
-
-        #fem el pas
-        if nom == "Euler Semi-Implícit":
-            dades["Y"] = pas_euler_semi_implicit(t_actual, dades["Y"], h)
-        else:
-            dades["Y"] = dades["func"](derivades, t_actual, dades["Y"], h)
-            
-    t_actual += h
-
-#gràfiques
-fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 7))
-
-#gràfic trajectòries
-ax1.plot(0, 0, 'o', color='gold', markersize=15, label='Sol', markeredgecolor='orange')
-for nom, dades in metodes.items():
-    ax1.plot(dades["x"], dades["y"], label=nom, color=dades["color"], linestyle=dades["style"], linewidth=1.5)
-
-ax1.set_title("Comparativa Trajectòries")
-ax1.set_xlabel("x (UA)")
-ax1.set_ylabel("y (UA)")
-ax1.axis('equal')
-ax1.grid(True, alpha=0.3)
-ax1.legend()
-
-#gràfic error d'Energia (Escala Logarítmica)
-for nom, dades in metodes.items():
-    #convertim el temps a dies
-    temps_dies = np.array(dades["t"]) * (r_per/v_per) / (24*3600)
-    ax2.plot(temps_dies, dades["error"], label=nom, color=dades["color"], linestyle=dades["style"])
-
-ax2.set_title("Error Relatiu d'Energia (Conservació)")
-ax2.set_xlabel("Temps (dies)")
-ax2.set_ylabel("|(E - E0) / E0|")
-ax2.set_yscale('log')
-ax2.grid(True, which="both", ls="-", alpha=0.3)
-ax2.legend()
-
-plt.tight_layout()
-plt.savefig('figures/comparativa_error_metodes.png', bbox_inches='tight')
-plt.show()
+def integrar_lot(passos_segons, t_final_segons, metodes=METODES, Y0=Y_inicial, historial=False):
+    '''Integra tots els mètodes amb tots els passos alhora.
+
+    L'estat té forma (3, metodes, passos): cada pas de la iteració avança totes
+    les columnes de cop. Cada pas h s'ajusta perquè t_final sigui un nombre
+    enter de passos; les columnes amb h gran acaben abans i deixen d'avançar
+    (els passos van ordenats de petit a gran, i només tallem l'array).
+    Retorna (passos ajustats en segons, Y final (3, M, H)) i, si historial,
+    també tots els estats (n+1, 3, M, H), amb les columnes acabades congelades'''
+    passos_segons = np.sort(np.atleast_1d(np.asarray(passos_segons, dtype=float)))
+    t_final = t_final_segons * SEGONS_A_ADIM
+    num_passos = np.maximum(np.round(t_final_segons / passos_segons).astype(int), 1)
+    passos = t_final / num_passos
+
+    Y = np.empty((3, len(metodes), len(passos)))
+    Y[...] = np.asarray(Y0, dtype=float)[:, None, None]
+    estats = [Y.copy()] if historial else None
+    actives = len(passos)
+    for i in range(num_passos[0]):
+        #columnes que encara han de fer el pas i
+        while num_passos[actives - 1] <= i:
+            actives -= 1
+        h_act = passos[:actives]
+        for m, dades in enumerate(metodes.values()):
+            Y[:, m, :actives] = dades["pas"](i * h_act, Y[:, m, :actives], h_act)
+        if historial:
+            estats.append(Y.copy())
+
+    passos_ajustats = passos / SEGONS_A_ADIM
+    if historial:
+        return passos_ajustats, Y, np.array(estats)
+    return passos_ajustats, Y
+
+
+def error_energia(Y, Y0=Y_inicial):
+    '''Error relatiu d'energia |(E - E0) / E0| de qualsevol array d'estats (3, ...)'''
+    E0 = calcular_energia(Y0)
+    return np.abs((calcular_energia(Y) - E0) / E0)
+
+
+def ordre_convergencia(passos, errors, error_minim=1e-13, error_maxim=1e-3):
+    '''Pendent de log(error) vs log(h) per a cada mètode, ajustada només al règim
+    asimptòtic: per sobre de l'error d'arrodoniment i lluny de la inestabilitat
+    dels passos grans. errors: (M, H)'''
+    ordres = []
+    for errors_metode in errors:
+        valids = (errors_metode > error_minim) & (errors_metode < error_maxim)
+        if valids.sum() < 2:
+            ordres.append(np.nan)
+            continue
+        ordres.append(np.polyfit(np.log(passos[valids]), np.log(errors_metode[valids]), 1)[0])
+    return np.array(ordres)
+
+
+def trajectories(simulacio_dies=400):
+    '''Trajectòries (UA) i error d'energia al llarg del temps amb el pas original h.
+    Retorna un diccionari amb 'temps_dies' (n+1,) i 'x', 'y', 'errors_temps' (n+1, M)'''
+    _, _, estats = integrar_lot(h / SEGONS_A_ADIM, simulacio_dies * 24 * 3600, historial=True)
+    estats = estats[..., 0] #(n+1, 3, M)
+    r_real = estats[:, 1] * r_per / UA
+    return {
+        'temps_dies': np.arange(len(estats)) * h / SEGONS_A_ADIM / (24*3600),
+        'x': r_real * np.cos(estats[:, 0]),
+        'y': r_real * np.sin(estats[:, 0]),
+        'errors_temps': error_energia(np.moveaxis(estats, 1, 0)),
+    }
+
+
+def convergencia(simulacio_dies=400, passos_segons=np.logspace(np.log10(PAS_MINIM), np.log10(PAS_MAXIM), 21)):
+    '''Error d'energia final vs h per a tots els mètodes i ordre de convergència.
+    Retorna un diccionari amb 'passos_segons' (H,), 'errors' (M, H) i 'ordres' (M,)'''
+    passos_segons, Y_final = integrar_lot(passos_segons, simulacio_dies * 24 * 3600)
+    errors = error_energia(Y_final) #(M, H)
+    ordres = ordre_convergencia(passos_segons, errors)
+    #els errors exactament zero (arrodoniment) no es veurien en escala log
+    errors = np.maximum(errors, np.finfo(float).eps)
+    return {'passos_segons': passos_segons, 'errors': errors, 'ordres': ordres}
+
+
+def grafica_comparativa(resultat, fitxer='figures/comparativa_error_metodes.png'):
+    import matplotlib.pyplot as plt
+    x, y = resultat['x'], resultat['y']
+
+    #gràfiques
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 7))
+
+    #gràfic trajectòries
+    ax1.plot(0, 0, 'o', color='gold', markersize=15, label='Sol', markeredgecolor='orange')
+    for m, (nom, dades) in enumerate(METODES.items()):
+        ax1.plot(x[:, m], y[:, m], label=nom, color=dades["color"], linestyle=dades["style"], linewidth=1.5)
+
+    ax1.set_title("Comparativa Trajectòries")
+    ax1.set_xlabel("x (UA)")
+    ax1.set_ylabel("y (UA)")
+    ax1.axis('equal')
+    ax1.grid(True, alpha=0.3)
+    ax1.legend()
+
+    #gràfic error d'Energia (Escala Logarítmica)
+    for m, (nom, dades) in enumerate(METODES.items()):
+        ax2.plot(resultat['temps_dies'], resultat['errors_temps'][:, m], label=nom, color=dades["color"],
+                 linestyle=dades["style"])
+
+    ax2.set_title("Error Relatiu d'Energia (Conservació)")
+    ax2.set_xlabel("Temps (dies)")
+    ax2.set_ylabel("|(E - E0) / E0|")
+    ax2.set_yscale('log')
+    ax2.grid(True, which="both", ls="-", alpha=0.3)
+    ax2.legend()
+
+    plt.tight_layout()
+    plt.savefig(fitxer, bbox_inches='tight')
+
+
+def grafica_convergencia(resultat, fitxer='figures/convergencia_metodes.png', simulacio_dies=400):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(9, 7))
+    for m, (nom, dades) in enumerate(METODES.items()):
+        ax.loglog(resultat['passos_segons'], resultat['errors'][m], marker='o', markersize=4, color=dades["color"],
+                  linestyle=dades["style"], label=f"{nom} (ordre ≈ {resultat['ordres'][m]:.2f})")
+    ax.set_title(f"Convergència: error d'energia després de {simulacio_dies} dies")
+    ax.set_xlabel("Pas h (s)")
+    ax.set_ylabel("|(E - E0) / E0|")
+    ax.grid(True, which="both", ls="-", alpha=0.3)
+    ax.legend()
+    plt.tight_layout()
+    plt.savefig(fitxer, bbox_inches='tight')
+
+
+if __name__ == '__main__':
+    import time
+    import matplotlib.pyplot as plt
+
+    #simulem una mica més d'un any (per veure si l'òrbita es tanca)
+    simulacio_dies = 400
+
+    #trajectòries i error al llarg del temps amb el pas original
+    grafica_comparativa(trajectories(simulacio_dies))
+
+    #estudi de convergència: error d'energia final vs h, de PAS_MINIM a PAS_MAXIM
+    inici = time.perf_counter()
+    resultat = convergencia(simulacio_dies)
+    print(f"{len(METODES)} mètodes x {len(resultat['passos_segons'])} passos integrats en "
+          f"{time.perf_counter() - inici:.1f} s")
+    for nom, ordre in zip(METODES, resultat['ordres']):
+        print(f"{nom}: ordre ≈ {ordre:.2f}")
+    grafica_convergencia(resultat, simulacio_dies=simulacio_dies)
+    plt.show()
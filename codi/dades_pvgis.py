@@ -0,0 +1,87 @@
+import os
+import re
+import hashlib
+import glob
+import numpy as np
+
+# Perfils diaris mitjans de PVGIS (irradiància global G(i) en W/m^2, per hores UTC)
+DIR_DADES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'irradiancia data')
+PATRO_FITXERS = 'Dailydata_41.638_2.356_SA3_*_0deg_0deg.csv'
+DIR_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache')
+
+# Una fila vàlida és "HH:MM" seguit del valor, amb qualsevol tabulació pel mig i pel final
+_FILA = re.compile(r'^\s*(\d{1,2}):(\d{2})\s+([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)')
+_MES = re.compile(r'_SA3_(\d{2})_')
+
+
+def _llegir_fitxer(fitxer):
+    # Retorna un array de 24 hores amb NaN a les hores que falten
+    valors = np.full(24, np.nan)
+    with open(fitxer, encoding='utf-8', errors='replace') as f:
+        for linia in f:
+            coincidencia = _FILA.match(linia)
+            if coincidencia is None: # capçalera, línies buides...
+                continue
+            hora = int(coincidencia.group(1))
+            valors[hora] = float(coincidencia.group(3))
+    return valors
+
+
+def _omplir_hores(valors):
+    # Omplim les hores que falten interpolant linealment dins del mateix dia
+    omplert = np.isnan(valors)
+    hores = np.arange(24)
+    for mes in np.flatnonzero(omplert.any(axis=1)):
+        conegut = ~omplert[mes]
+        valors[mes, ~conegut] = np.interp(hores[~conegut], hores[conegut], valors[mes, conegut])
+    return valors, omplert
+
+
+def parsejar_pvgis(directori=DIR_DADES):
+    '''Llegeix els dotze fitxers mensuals i retorna (G, omplert, mtimes).
+    G: array (12, 24) en W/m^2 per mes i hora UTC
+    omplert: array booleà (12, 24) amb les hores que no hi eren i hem interpolat'''
+    fitxers = sorted(glob.glob(os.path.join(directori, PATRO_FITXERS)))
+    valors = np.full((12, 24), np.nan)
+    mtimes = np.zeros(12)
+    for fitxer in fitxers:
+        mes = int(_MES.search(os.path.basename(fitxer)).group(1))
+        valors[mes - 1] = _llegir_fitxer(fitxer)
+        mtimes[mes - 1] = os.path.getmtime(fitxer)
+
+    if np.isnan(valors).all(axis=1).any():
+        mesos = np.flatnonzero(np.isnan(valors).all(axis=1)) + 1
+        raise FileNotFoundError(f"Falten les dades PVGIS dels mesos {list(mesos)} a {directori}")
+
+    G, omplert = _omplir_hores(valors)
+    return G, omplert, mtimes
+
+
+def carregar_pvgis(directori=DIR_DADES, usar_cache=True):
+    '''Com parsejar_pvgis, però guardant el resultat en un .npz per directori (el nom
+    porta un hash del camí i dels noms dels fitxers) que s'invalida quan canvia
+    la data de modificació de qualsevol dels fitxers.
+    Retorna un diccionari amb 'G' (12, 24), 'omplert' (12, 24) i 'hores' (24,)'''
+    fitxers = sorted(glob.glob(os.path.join(directori, PATRO_FITXERS)))
+    mtimes = np.array([os.path.getmtime(f) for f in fitxers])
+    origen = (os.path.realpath(directori), [os.path.basename(f) for f in fitxers])
+    fitxer_cache = os.path.join(DIR_CACHE, f'pvgis_{hashlib.sha1(repr(origen).encode()).hexdigest()[:16]}.npz')
+
+    if usar_cache and os.path.exists(fitxer_cache):
+        with np.load(fitxer_cache) as dades:
+            if np.array_equal(dades['mtimes'], mtimes):
+                return {'G': dades['G'], 'omplert': dades['omplert'], 'hores': np.arange(24)}
+
+    G, omplert, mtimes_mes = parsejar_pvgis(directori)
+    if usar_cache:
+        os.makedirs(DIR_CACHE, exist_ok=True)
+        np.savez(fitxer_cache, G=G, omplert=omplert, mtimes=mtimes_mes)
+    return {'G': G, 'omplert': omplert, 'hores': np.arange(24)}
+
+
+if __name__ == '__main__':
+    dades = carregar_pvgis()
+    for mes in range(12):
+        hores_omplertes = np.flatnonzero(dades['omplert'][mes])
+        nota = f" (omplertes: {hores_omplertes.tolist()})" if len(hores_omplertes) else ''
+        print(f"Mes {mes + 1:2d}: {dades['G'][mes].sum() / 1000:.2f} kWh/m^2/dia{nota}")
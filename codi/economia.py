@@ -0,0 +1,149 @@
+import numpy as np
+from optimitzacio_panells import PREU_COMPRA_XARXA, PREU_VENDA_EXCEDENT, VIDA_UTIL, POTENCIA_PIC_PANELL
+
+# --- Paràmetres financers per defecte --- #
+TAXA_DESCOMPTE = 0.03 # anual
+DEGRADACIO_ANUAL = 0.005 # pèrdua de rendiment dels panells per any
+ESCALAT_PREU_COMPRA = 0.02 # augment anual del preu de la llum
+ESCALAT_PREU_VENDA = 0.0 # augment anual de la compensació d'excedents
+COST_INVERSOR_WP = 0.10 # €/Wp per substituir l'inversor
+ANY_SUBSTITUCIO_INVERSOR = 12
+MANTENIMENT_ANUAL = 0.0 # €/any (creix amb ESCALAT_PREU_COMPRA com la resta de costos)
+
+
+def fluxos_caixa(kwh_autoconsum, kwh_excedent, inversio, preu_compra=PREU_COMPRA_XARXA,
+                 preu_venda=PREU_VENDA_EXCEDENT, vida_util=VIDA_UTIL, degradacio=DEGRADACIO_ANUAL,
+                 escalat_compra=ESCALAT_PREU_COMPRA, escalat_venda=ESCALAT_PREU_VENDA,
+                 cost_inversor=0.0, any_inversor=ANY_SUBSTITUCIO_INVERSOR,
+                 manteniment_anual=MANTENIMENT_ANUAL):
+    '''Flux de caixa de cada any (0 = inversió) per a tots els escenaris alhora.
+
+    Tots els arguments es combinen per broadcasting (p.ex. kWh (panells, consum, 1)
+    i preus (escenari,)), i els anys s'afegeixen com a últim eix: una sola
+    simulació de l'energia de l'any 1 serveix per a milers de casos financers.
+    La degradació escala l'autoconsum i l'excedent de l'any 1 per igual (aproximació:
+    en realitat l'excedent baixa abans). La substitució de l'inversor es paga
+    l'any any_inversor si cau dins la vida útil.
+    Retorna (fluxos (..., vida_util + 1), energia generada (..., vida_util + 1) en kWh)'''
+    anys = np.arange(vida_util + 1)
+    t = np.maximum(anys - 1, 0) # anys des del primer any de producció
+    produeix = anys >= 1
+    degradat = np.where(produeix, (1 - np.asarray(degradacio)[..., None]) ** t, 0.0)
+
+    def per_any(x):
+        return np.asarray(x, dtype=float)[..., None]
+
+    ingressos = degradat * (per_any(kwh_autoconsum) * per_any(preu_compra) * (1 + per_any(escalat_compra)) ** t
+                            + per_any(kwh_excedent) * per_any(preu_venda) * (1 + per_any(escalat_venda)) ** t)
+    costos = (per_any(manteniment_anual) * (1 + per_any(escalat_compra)) ** t * produeix
+              + per_any(cost_inversor) * (anys == any_inversor))
+    fluxos = ingressos - costos - per_any(inversio) * (anys == 0)
+    energia = degradat * per_any(np.asarray(kwh_autoconsum) + np.asarray(kwh_excedent))
+    return fluxos, energia
+
+
+def _van(fluxos, taxa):
+    # Valor actual net amb una taxa per escenari (broadcast sobre el darrer eix d'anys)
+    anys = np.arange(fluxos.shape[-1])
+    return (fluxos / (1 + np.asarray(taxa)[..., None]) ** anys).sum(axis=-1)
+
+
+def tir(fluxos, minim=-0.99, maxim=1.0, iteracions=60):
+    '''Taxa interna de retorn de cada escenari per bisecció vectoritzada.
+    NaN si el VAN no canvia de signe a [minim, maxim] (p.ex. no es recupera mai)'''
+    baix = np.full(fluxos.shape[:-1], minim)
+    alt = np.full(fluxos.shape[:-1], maxim)
+    van_baix = _van(fluxos, baix)
+    valid = np.sign(van_baix) != np.sign(_van(fluxos, alt))
+    for _ in range(iteracions):
+        mig = (baix + alt) / 2
+        van_mig = _van(fluxos, mig)
+        mateix = np.sign(van_mig) == np.sign(van_baix)
+        baix = np.where(mateix, mig, baix)
+        van_baix = np.where(mateix, van_mig, van_baix)
+        alt = np.where(mateix, alt, mig)
+    return np.where(valid, (baix + alt) / 2, np.nan)
+
+
+def retorn_descomptat(fluxos, taxa=TAXA_DESCOMPTE):
+    '''Anys (amb fracció, interpolant dins l'any) fins que el flux descomptat
+    acumulat es fa positiu; NaN si no passa dins la vida útil'''
+    anys = np.arange(fluxos.shape[-1])
+    acumulat = np.cumsum(fluxos / (1 + np.asarray(taxa)[..., None]) ** anys, axis=-1)
+    positiu = acumulat >= 0
+    k = np.argmax(positiu, axis=-1) # primer any amb l'acumulat positiu
+    anterior = np.take_along_axis(acumulat, np.maximum(k - 1, 0)[..., None], axis=-1)[..., 0]
+    actual = np.take_along_axis(acumulat, k[..., None], axis=-1)[..., 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraccio = np.where(k > 0, -anterior / (actual - anterior), 0.0)
+    return np.where(positiu.any(axis=-1), np.maximum(k - 1, 0) + fraccio, np.nan)
+
+
+def valor_actual_net(kwh_autoconsum, kwh_excedent, inversio, taxa_descompte=TAXA_DESCOMPTE, **opcions):
+    '''Només el VAN d'analisi_economica (sense la bisecció de la TIR), per triar
+    l'òptim en escombrats grans. opcions: es passen a fluxos_caixa'''
+    fluxos, _ = fluxos_caixa(kwh_autoconsum, kwh_excedent, inversio, **opcions)
+    return _van(fluxos, taxa_descompte)
+
+
+def analisi_economica(kwh_autoconsum, kwh_excedent, inversio, taxa_descompte=TAXA_DESCOMPTE, **opcions):
+    '''VAN, TIR, retorn descomptat i LCOE de tots els escenaris de cop.
+    opcions: es passen a fluxos_caixa (preus, vida útil, degradació, escalats, inversor...)
+    Retorna un diccionari d'arrays amb la forma comuna dels arguments'''
+    fluxos, energia = fluxos_caixa(kwh_autoconsum, kwh_excedent, inversio, **opcions)
+    anys = np.arange(fluxos.shape[-1])
+    descompte = (1 + np.asarray(taxa_descompte)[..., None]) ** anys
+
+    # LCOE: costos descomptats (inversió, manteniment, inversor) / energia descomptada
+    opcions_costos = dict(opcions, preu_compra=0.0, preu_venda=0.0)
+    costos, _ = fluxos_caixa(kwh_autoconsum, kwh_excedent, inversio, **opcions_costos)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lcoe = (-costos / descompte).sum(axis=-1) / (energia / descompte).sum(axis=-1)
+
+    return {
+        'van': _van(fluxos, taxa_descompte),
+        'tir': tir(fluxos),
+        'retorn_descomptat_anys': retorn_descomptat(fluxos, taxa_descompte),
+        'lcoe': lcoe,
+        'fluxos_caixa': fluxos,
+    }
+
+
+if __name__ == '__main__':
+    import time
+    from optimitzacio_panells import (altures_any, perfil_generacio_unitari, escombrat_panells,
+                                      PREU_PANELL)
+    from calibracio import calibrar, factor_atmosferic
+
+    _, altures = altures_any()
+    dies = np.arange('2026-01-01', '2027-01-01', dtype='datetime64[D]')
+    mesos = dies.astype('datetime64[M]').astype(int) % 12
+    factor = factor_atmosferic(altures, mesos[:, None], calibrar()['transmitancia'])
+    from perdues import CadenaPerdues
+    resultat = escombrat_panells(perfil_generacio_unitari(altures, factor_atmosferic=factor,
+                                                          perdues=CadenaPerdues(), dies=dies))
+    panells = resultat['panells']
+
+    # Escenari base per nombre de panells
+    inversio = panells * PREU_PANELL
+    cost_inversor = panells * POTENCIA_PIC_PANELL * COST_INVERSOR_WP
+    base = analisi_economica(resultat['kwh_autoconsum'][:, 0], resultat['kwh_excedent'][:, 0],
+                             inversio, cost_inversor=cost_inversor)
+    i = int(np.nanargmax(base['van']))
+    print(f"Òptim per VAN: {panells[i]} panells, VAN {base['van'][i]:.0f} €, TIR {base['tir'][i] * 100:.1f}%, "
+          f"retorn {base['retorn_descomptat_anys'][i]:.1f} anys, LCOE {base['lcoe'][i] * 100:.1f} c€/kWh")
+
+    # Milers de casos financers sobre la mateixa energia: (panells, taxa, escalat, degradació)
+    taxes = np.linspace(0.0, 0.08, 9)[:, None, None]
+    escalats = np.linspace(-0.01, 0.05, 13)[:, None]
+    degradacions = np.linspace(0.0, 0.01, 11)
+    forma = (len(panells), 1, 1, 1)
+    inici = time.perf_counter()
+    escombrat = analisi_economica(resultat['kwh_autoconsum'][:, 0].reshape(forma),
+                                  resultat['kwh_excedent'][:, 0].reshape(forma),
+                                  inversio.reshape(forma), taxa_descompte=taxes,
+                                  escalat_compra=escalats, degradacio=degradacions,
+                                  cost_inversor=cost_inversor.reshape(forma))
+    casos = escombrat['van'].size
+    print(f"{casos} casos financers en {(time.perf_counter() - inici) * 1000:.0f} ms; "
+          f"VAN positiu en el {np.mean(escombrat['van'] > 0) * 100:.0f}%")
@@ -0,0 +1,57 @@
+import numpy as np
+import trajectoria
+from instrumentacio import instrumentar
+
+# Considerem que el periheli de referència és el 3 de Gener de 2026 (0h UTC)
+DIA_PERIHELI = np.datetime64('2026-01-03T00:00', 'ns')
+
+
+class EfemeridesTerra:
+    '''Posició de la Terra en qualsevol instant a partir de l'òrbita integrada a trajectoria.
+
+    Ajustem splines cúbics periòdics a r(t) i a l'anomalia corregida
+    theta(t) - 2*pi*t/P, de manera que podem avaluar la posició en temps
+    fraccionaris (dins del dia) i en qualsevol any sense refinar el pas de RK4.'''
+
+    def __init__(self, orbita=None, dia_periheli=DIA_PERIHELI):
+        if orbita is None:
+            orbita = trajectoria.calcular_orbita()
+        from scipy.interpolate import CubicSpline
+        self.dia_periheli = np.datetime64(dia_periheli, 'ns')
+
+        # Ens quedem amb la primera volta
+        volta = orbita['theta'] < 2*np.pi
+        t, theta, r = orbita['t'][volta], orbita['theta'][volta], orbita['r'][volta]
+
+        # Període: el que dona l'integrador si el coneix (veure trajectoria.orbita_densa);
+        # si no, allarguem l'últim punt fins a theta = 2*pi amb la velocitat angular local
+        if 'periode' in orbita:
+            self.periode = float(orbita['periode'])
+        else:
+            spline_theta = CubicSpline(t, theta)
+            self.periode = t[-1] + (2*np.pi - theta[-1]) / spline_theta(t[-1], 1)
+
+        # Tanquem la volta amb el punt del periheli següent i ajustem splines periòdics
+        t = np.append(t, self.periode)
+        correccio = np.append(theta, 2*np.pi) - 2*np.pi * t / self.periode
+        r = np.append(r, r[0])
+        self._spline_correccio = CubicSpline(t, correccio, bc_type='periodic')
+        self._spline_r = CubicSpline(t, r, bc_type='periodic')
+
+    def dies_des_del_periheli(self, instants_utc):
+        # Temps (dies, amb fracció) des del periheli de referència
+        instants_utc = np.asarray(instants_utc, dtype='datetime64[ns]')
+        return (instants_utc - self.dia_periheli) / np.timedelta64(1, 'D')
+
+    def posicio_dies(self, t_dies):
+        '''Vectors (..., 3) de posició de la Terra (UA) en t_dies des del periheli'''
+        t_dies = np.asarray(t_dies, dtype=float)
+        fase = np.mod(t_dies, self.periode)
+        theta = self._spline_correccio(fase) + 2*np.pi * fase / self.periode
+        r = self._spline_r(fase)
+        return np.stack([r * np.cos(theta), r * np.sin(theta), np.zeros_like(r)], axis=-1)
+
+    @instrumentar()
+    def posicio(self, instants_utc):
+        '''Vectors (..., 3) de posició de la Terra (UA) per a un array de datetime64 UTC'''
+        return self.posicio_dies(self.dies_des_del_periheli(instants_utc))
@@ -0,0 +1,34 @@
+import csv
+from dataclasses import dataclass, fields
+from func_canvibase import LAT_CARDEDEU, LON_CARDEDEU
+from zona_horaria import ZONA_PER_DEFECTE
+from optimitzacio_panells import CONSUM_ANUAL_LLAR, PREU_COMPRA_XARXA, PREU_VENDA_EXCEDENT, PREU_PANELL
+
+
+@dataclass(frozen=True)
+class Emplacament:
+    '''Dades d'una instal·lació: on és, quina hora hi fan, quant consumeix i a quin preu'''
+    nom: str = 'Cardedeu'
+    lat: float = LAT_CARDEDEU  # Graus Nord
+    lon: float = LON_CARDEDEU  # Graus Est
+    zona_horaria: str = ZONA_PER_DEFECTE
+    consum_anual_kWh: float = CONSUM_ANUAL_LLAR
+    preu_compra: float = PREU_COMPRA_XARXA  # €/kWh
+    preu_venda: float = PREU_VENDA_EXCEDENT  # €/kWh
+    preu_panell: float = PREU_PANELL  # €
+
+
+CARDEDEU = Emplacament()
+
+
+def llegir_emplacaments(fitxer):
+    '''Llegeix un CSV amb una fila per emplaçament. Les columnes tenen els noms
+    dels camps d'Emplacament; les que no hi són prenen el valor per defecte'''
+    tipus = {camp.name: camp.type for camp in fields(Emplacament)}
+    emplacaments = []
+    with open(fitxer, newline='', encoding='utf-8') as f:
+        for fila in csv.DictReader(f):
+            valors = {clau: (float(valor) if tipus[clau] is float else valor)
+                      for clau, valor in fila.items() if clau in tipus and valor not in (None, '')}
+            emplacaments.append(Emplacament(**valors))
+    return emplacaments
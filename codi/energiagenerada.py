@@ -1,62 +1,19 @@
 import numpy as np
 import datetime
-import matplotlib.pyplot as plt
-import trajectoria
-from func_canvibase import posiciosol
-
-#--- DADES TRAJECTÒRIA TERRA --- #
-x_tierra = trajectoria.x 
-y_tierra = trajectoria.y
-z_tierra = np.array([0.0] * x_tierra.size)
+from calibracio import factor_atmosferic
+from zona_horaria import local_a_utc
+from llum_dia import coordenades_emplacament, sortida_posta, posiciosol_dia, usar_mascara_dia
+import cache_solar
+from perdues import aplicar_perdues, temperatura_ambient
+from ombres import mascara_sol
+from instrumentacio import instrumentar
 
 # --- Configuració Inicial --- #
 # Definim el dia del periheli (Considerem que és el 3 de Gener de 2026)
 dia_periheli = datetime.date(2026, 1, 3) 
 
-# Fem una llista amb els dies fins el 3 de gener de 2027
-numdies = 366
-dies = [dia_periheli + datetime.timedelta(days=x) for x in range(numdies)]
-
-lists_azimuts = []
-lists_altures = []
-lists_minuts = []
-
-# --- BUCLE ANY --- #
-for dia, x, y, z in zip(dies, x_tierra, y_tierra, z_tierra):
-    vector_posicio = np.array([x, y, z])
-    list_azimut = []
-    list_altura = []
-    list_minuts = []
-
-    # --- BUCLE DIA --- #
-    for minut in range(0, 24 * 60, 10): 
-        # 1. Crear l'hora local
-        hora_local = datetime.datetime(
-            dia.year, dia.month, dia.day, 0, 0
-        ) + datetime.timedelta(minutes=minut)
-        
-        # 2. Convertir a UTC, segons el dia
-        if dia > datetime.date(2026, 3, 29) and dia < datetime.date(2026, 10, 26):
-            offset_horari = 2
-        else: 
-            offset_horari = 1
-
-        data_utc = hora_local - datetime.timedelta(hours=offset_horari)
-
-        # 3. Calcular azimut i alçada
-        az, alt = posiciosol(vector_posicio, data_utc)
-        
-        #4. Filtrar
-        if alt > -10:
-            list_azimut.append(az)
-            list_altura.append(alt)
-            list_minuts.append(minut)
-
-    # --- Emmagatzemem els azimuts i altures de cada dia, amb els minuts corresponents --- #
-    lists_azimuts.append(list_azimut)
-    lists_altures.append(list_altura)
-    lists_minuts.append(list_minuts)
-
+# Fem una llista amb els dies fins el 2 de gener de 2027
+numdies = 365
 
 # Suposem que les plaques estan paral·leles al terra
 # Angle que formen vector normal a la placa i vector posicio sol: alçada
@@ -65,32 +22,103 @@ A = 2 #Àrea de les plaques (m^2)
 N = 4 #Nombre de plaques
 potencia_maxima_panel = 400 #Potència pic per panel (W)
 
-# --- INICIALITZACIÓ --- #
-# Convertim les llistes en arrays de objectes per iterar més fàcil si no són rectangulars
-# Si totes les llistes tenen la mateixa longitud, seria millor fer un array 2D directament
-t = np.arange(1, 366, 1)
-Energia_diaria_Wh = [] #Guardarem energia en Watt-hora, no només potència instantànea.
-
-# --- BUCLE ---
-for alt_list, min_list in zip(lists_altures, lists_minuts):
-    altures = np.array(alt_list) # Convertim a arrays de numpy per calcular tot el dia de cop (vectorització)
-    altures = np.maximum(altures, 0) # El sol només aporta energia si està sobre l'horitzó, a més, limitem per evitar valors negaius en el sinus
-    rad_altures = np.radians(altures)
-    irradiancia = I_d*np.sin(rad_altures) # Càlcul de irradiància (W/m^2) sobre el pla horitzontal, utilitzem sin(altura)
-    # Si la placa és plana al terra, la normal és vertical, i l'angle de incidència és 90 - altura.
-    potencia_inst = irradiancia*(potencia_maxima_panel*N/1000) # Potència bruta
-    potencia_real = np.minimum(potencia_inst, potencia_maxima_panel*N) # Si la potencia supera el màxim de les plaques, es retalla
-    energia_dia_wh = np.sum(potencia_real) / 60.0 # Càlcul d'energia diaria en Watt-hora, suposem que cada dada en la llista correspon a un minut de diferència
-
-    Energia_diaria_Wh.append(energia_dia_wh)
-
-# --- GRÀFIC --- #
-plt.figure(figsize=(10, 6))
-
-plt.plot(t, Energia_diaria_Wh)
-#plt.plot(np.arange(0,len(I_abs_horaria[0]), 1), I_abs_horaria[0]) 
-# COMENTARIO A BORRAR: El calculo de la intensidad cada hora no funciona, 
-# pero el de la potencia sí, en verdad no hace falta era solo para comparar con el PVGS
-
-plt.gca().tick_params(direction="in")
-plt.savefig(f'figures/energia.png', bbox_inches='tight')
\ No newline at end of file
+
+@instrumentar()
+def simular_any(resolucio=10, N=N, dia_inici=dia_periheli, numdies=numdies, efemerides=None,
+                transmitancia=None, emplacament=None, nomes_dia=None, usar_cache=True, perdues=None,
+                horitzo=None):
+    '''Simula un any sencer de cop sobre una graella densa (dia x instant).
+    resolucio: minuts entre mostres (d'1 a 60, divisor de 1440)
+    transmitancia: array (12,) per mes (veure calibracio.calibrar); si és None
+    s'usa la constant solar extraterrestre sense atenuació
+    emplacament: objecte amb atributs lat, lon i zona_horaria (per defecte Cardedeu)
+    nomes_dia: només calcula la posició del sol entre la sortida i la posta
+    (la resta de mostres queden a NaN i no aporten energia); per defecte (None)
+    només a les resolucions on surt a compte (veure llum_dia.RESOLUCIO_MASCARA_DIA).
+    Sense màscara, durada_dia_hores es compta sobre les mostres amb sol
+    usar_cache: amb l'efemèride per defecte, la posició del sol surt de cache_solar
+    perdues: perdues.CadenaPerdues (temperatura amb el clima típic, cablejat, inversor...);
+    si és None la potència és la ideal retallada a la potència pic
+    horitzo: taula d'elevació de l'horitzó i obstacles (veure ombres.taula_horitzo)
+    Retorna un diccionari amb els arrays 2D d'azimut, alçada, irradiància (W/m^2)
+    i potència (W), i l'energia diària en Wh integrada amb el dt correcte'''
+    if not (1 <= resolucio <= 60) or (24 * 60) % resolucio != 0:
+        raise ValueError("La resolució ha de ser un divisor de 1440 entre 1 i 60 minuts")
+
+    nomes_dia = usar_mascara_dia(nomes_dia, resolucio)
+
+    # --- INSTANTS DE TOT L'ANY --- #
+    minuts_dia = np.arange(0, 24 * 60, resolucio)
+    dies_np = np.datetime64(dia_inici, 'D') + np.arange(numdies)
+
+    # 1. Hora local de cada mostra (dia x minut)
+    hores_locals = dies_np[:, None] + minuts_dia[None, :].astype('timedelta64[m]')
+
+    # 2. Convertir a UTC, amb els canvis d'hora de la zona de l'any que toqui
+    lat, lon, zona = coordenades_emplacament(emplacament)
+    dates_utc = local_a_utc(hores_locals, zona)
+
+    # 3. Calcular azimut i alçada de tot l'any de cop (posició de la Terra a cada instant)
+    if efemerides is None:
+        posicions = cache_solar.posicions(dies_np[0], numdies, resolucio, emplacament, nomes_dia, usar_cache)
+        azimuts, altures = posicions['azimuts'], posicions['altures']
+        durada_dia_hores = posicions.get('durada_hores')
+    else:
+        llum = sortida_posta(dies_np, emplacament, efemerides) if nomes_dia else None
+        azimuts, altures = posiciosol_dia(efemerides.posicio, dates_utc, llum, lat, lon)
+        durada_dia_hores = None if llum is None else llum['durada_hores']
+
+    # 4. En lloc de filtrar en llistes, emmascarem: el sol només aporta energia sobre l'horitzó
+    sol = altures > 0
+    if durada_dia_hores is None:
+        durada_dia_hores = sol.sum(axis=1) * resolucio / 60
+    if horitzo is not None:
+        sol &= mascara_sol(horitzo, azimuts, altures)
+    irradiancia = np.where(sol, I_d * np.sin(np.radians(altures)), 0.0) # W/m^2 sobre el pla horitzontal
+    if transmitancia is not None:
+        mesos = dies_np.astype('datetime64[M]').astype(int) % 12
+        irradiancia = irradiancia * factor_atmosferic(altures, mesos[:, None], transmitancia)
+
+    potencia_inst = irradiancia * (potencia_maxima_panel * N / 1000) # Potència bruta
+    potencia_real = np.minimum(potencia_inst, potencia_maxima_panel * N) # Si la potencia supera el màxim de les plaques, es retalla
+    if perdues is not None:
+        temperatura = temperatura_ambient(dies_np, minuts_dia)
+        potencia_real = aplicar_perdues(potencia_real, irradiancia, temperatura, potencia_maxima_panel * N, perdues)
+
+    # Cada mostra representa 'resolucio' minuts: E (Wh) = suma(P) * dt (h)
+    dt_h = resolucio / 60.0
+    energia_diaria_Wh = potencia_real.sum(axis=1) * dt_h
+
+    return {
+        'dies': dies_np,
+        'durada_dia_hores': durada_dia_hores,
+        'minuts': minuts_dia,
+        'dates_utc': dates_utc,
+        'azimuts': azimuts,
+        'altures': altures,
+        'irradiancia': irradiancia,
+        'potencia': potencia_real,
+        'energia_diaria_Wh': energia_diaria_Wh,
+    }
+
+
+def grafica_energia(Energia_diaria_Wh, fitxer='figures/energia.png'):
+    import matplotlib.pyplot as plt
+    t = np.arange(1, len(Energia_diaria_Wh) + 1)
+
+    # --- GRÀFIC --- #
+    plt.figure(figsize=(10, 6))
+
+    plt.plot(t, Energia_diaria_Wh)
+
+    plt.gca().tick_params(direction="in")
+    plt.savefig(fitxer, bbox_inches='tight')
+
+
+if __name__ == '__main__':
+    from calibracio import calibrar
+    from perdues import CadenaPerdues
+    simulacio = simular_any(transmitancia=calibrar()['transmitancia'], perdues=CadenaPerdues())
+    Energia_diaria_Wh = simulacio['energia_diaria_Wh'] #Guardarem energia en Watt-hora, no només potència instantànea.
+    print(f"Energia anual: {Energia_diaria_Wh.sum() / 1000:.1f} kWh")
+    grafica_energia(Energia_diaria_Wh)
@@ -1,5 +1,6 @@
 import numpy as np
 import datetime
+from instrumentacio import instrumentar
 
 # --- CONFIGURACIÓ ---
 # Coordenades aproximades de Cardedeu
@@ -15,15 +16,22 @@ RADI_TERRA_KM = 6371.0
 UA_KM = 149597870.7
 RADI_TERRA_UA = RADI_TERRA_KM / UA_KM
 
-def calcular_temps_sideral_greenwich(fecha_utc: datetime.datetime) -> float:
+def calcular_temps_sideral_greenwich_vec(instants_utc) -> np.ndarray:
+    '''Temps sideri de Greenwich (graus) per a molts instants alhora.
+    instants_utc: array de numpy.datetime64 (qualsevol precisió, també sub-segon)
+    o array de segons des de 1970-01-01 UTC (epoch)'''
     # TEMPS SIDERI LOCAL: formules a la bibliografia (veure informe) 
-    year, month, day = fecha_utc.year, fecha_utc.month, fecha_utc.day
-    hour, minute, second = fecha_utc.hour, fecha_utc.minute, fecha_utc.second
-    UT = hour + (minute/60) + (second/3600) # Hora universal!
-    term1 = 367 * year
-    term2 = int((7 * (year + int((month + 9) / 12))) / 4)
-    term3 = int((275 * month) / 9)
-    J0 = term1 - term2 + term3 + day + 1721013.5 
+    instants_utc = np.asarray(instants_utc)
+    if instants_utc.dtype.kind == 'M':
+        # Separem dies i fracció del dia en enters (ns) per no perdre precisió
+        ns = instants_utc.astype('datetime64[ns]').astype(np.int64)
+        dies_epoch, ns_del_dia = np.divmod(ns, 86400 * 10**9)
+        UT = ns_del_dia / 3.6e12 # Hora universal!
+    else:
+        segons = instants_utc.astype(float)
+        dies_epoch = np.floor(segons / 86400.0)
+        UT = (segons - dies_epoch * 86400.0) / 3600.0 # Hora universal!
+    J0 = dies_epoch + 2440587.5 # Dia Julià a les 0h UT (1970-01-01 0h UT = 2440587.5)
 
     J2000 = 2451545.0
     T0 = (J0 - J2000) / 36525.0
@@ -35,7 +43,13 @@ def calcular_temps_sideral_greenwich(fecha_utc: datetime.datetime) -> float:
     Theta_G = Theta_G0 + 360.98564724 * (UT / 24.0)
     return Theta_G % 360.0
 
-def posiciosol(vector_origen: np.array, fecha_utc: datetime.datetime):  
+def calcular_temps_sideral_greenwich(fecha_utc: datetime.datetime) -> float:
+    # Embolcall escalar de calcular_temps_sideral_greenwich_vec per als usos amb datetime
+    instant = np.datetime64(fecha_utc.replace(tzinfo=None), 'ns')
+    return float(calcular_temps_sideral_greenwich_vec(instant))
+
+def posiciosol(vector_origen: np.array, fecha_utc: datetime.datetime,
+               lat=LAT_CARDEDEU, lon=LON_CARDEDEU):  
     # PAS A: CORRECCIÓ DE PERIHELI A VERNAL
     # Matriu rotació Rz (sentit horari)
     rad_per = np.radians(LONGITUT_PERIHELI)
@@ -62,7 +76,7 @@ def posiciosol(vector_origen: np.array, fecha_utc: datetime.datetime):
 
     # PAS C.1: TEMPS SIDERI LOCAL
     Theta_G = calcular_temps_sideral_greenwich(fecha_utc)
-    Theta_L = (Theta_G + LON_CARDEDEU) % 360.0
+    Theta_L = (Theta_G + lon) % 360.0
    
     # PAS C.2: EQUATORIAL -> TOPOCENTRICA 
     # Matriu rotació Rz (sentit antihorari)
@@ -74,7 +88,7 @@ def posiciosol(vector_origen: np.array, fecha_utc: datetime.datetime):
     ])
 
     # Matriu rotació Ry (sentit antihorari)
-    lat_rad = np.radians(LAT_CARDEDEU)
+    lat_rad = np.radians(lat)
     co_latitud = (np.pi / 2) - lat_rad  # 90º - latitud
     R_y = np.array([ 
         [np.cos(co_latitud), 0, -np.sin(co_latitud)],
@@ -97,4 +111,102 @@ def posiciosol(vector_origen: np.array, fecha_utc: datetime.datetime):
     # Ajust final per tal que 0=Nord, 90=Est (Navegació Estàndard)
     az = (180 - az) % 360
     
-    return az, h
\ No newline at end of file
+    return az, h
+
+
+# --- VERSIÓ VECTORITZADA --- #
+# Les rotacions de periheli i obliqüitat no depenen de l'instant, les calculem un sol cop
+_rad_per = np.radians(LONGITUT_PERIHELI)
+_ROT_PERIHELI = np.array([
+    [np.cos(_rad_per), -np.sin(_rad_per), 0],
+    [np.sin(_rad_per),  np.cos(_rad_per), 0],
+    [0, 0, 1]
+])
+_rad_obl = np.radians(OBLIQUITAT)
+_ROT_OBLIQUITAT = np.array([
+    [1, 0, 0],
+    [0, np.cos(_rad_obl), -np.sin(_rad_obl)],
+    [0, np.sin(_rad_obl),  np.cos(_rad_obl)]
+])
+# Eclíptica referida al periheli -> Equatorial (inclou el canvi de signe Terra -> Sol)
+_ROT_ECLIPTICA_EQUATORIAL = -_ROT_OBLIQUITAT @ _ROT_PERIHELI
+
+
+def vector_sol_equatorial(vectors_origen: np.ndarray) -> np.ndarray:
+    '''PAS A i B per lots: posició de la Terra (..., 3) -> vector cap al Sol en
+    coordenades equatorials (..., 3). No depèn de l'emplaçament'''
+    return np.asarray(vectors_origen, dtype=float) @ _ROT_ECLIPTICA_EQUATORIAL.T
+
+def equatorial_a_horitzontal(r_eq: np.ndarray, Theta_G: np.ndarray,
+                             lat=LAT_CARDEDEU, lon=LON_CARDEDEU):
+    '''PAS C i D per lots: vectors equatorials (..., 3) i temps sideri de Greenwich
+    (..., en graus) -> azimut i alçada (graus) vistos des de (lat, lon)'''
+    Theta_G = np.asarray(Theta_G, dtype=float)
+    r_eq = np.broadcast_to(r_eq, Theta_G.shape + (3,))
+
+    # PAS C.1: TEMPS SIDERI LOCAL (un valor per instant)
+    Theta_L = np.radians((Theta_G + lon) % 360.0)
+
+    # PAS C.2: EQUATORIAL -> TOPOCENTRICA
+    # Apilem una matriu R_z per instant i apliquem totes les rotacions de cop
+    cos_L, sin_L = np.cos(Theta_L), np.sin(Theta_L)
+    R_z = np.zeros(Theta_L.shape + (3, 3))
+    R_z[..., 0, 0] = cos_L
+    R_z[..., 0, 1] = sin_L
+    R_z[..., 1, 0] = -sin_L
+    R_z[..., 1, 1] = cos_L
+    R_z[..., 2, 2] = 1
+
+    co_latitud = (np.pi / 2) - np.radians(lat)
+    R_y = np.array([
+        [np.cos(co_latitud), 0, -np.sin(co_latitud)],
+        [0, 1, 0],
+        [np.sin(co_latitud), 0, np.cos(co_latitud)]
+    ])
+
+    vec_temp = np.einsum('...ij,...j->...i', R_z, r_eq)
+    r_topo = vec_temp @ R_y.T
+    r_topo[..., 2] -= RADI_TERRA_UA
+
+    # PAS D: OBTENCIÓ DE L'AZIMUT I L'ALÇADA
+    x_topo, y_topo, z_topo = r_topo[..., 0], r_topo[..., 1], r_topo[..., 2]
+    distancia_topo = np.linalg.norm(r_topo, axis=-1)
+
+    h = np.degrees(np.arcsin(z_topo / distancia_topo))
+    az = np.degrees(np.arctan2(y_topo, x_topo))
+    az = (180 - az) % 360
+
+    return az, h
+
+@instrumentar()
+def posiciosol_vectoritzat(vectors_origen: np.ndarray, dates_utc: np.ndarray,
+                           lat=LAT_CARDEDEU, lon=LON_CARDEDEU):
+    '''Versió per lots de posiciosol.
+    vectors_origen: array (N,3) de posicions de la Terra (UA), o un sol vector (3,)
+    dates_utc: array (N,) de numpy.datetime64 en UTC
+    lat, lon: coordenades de l'observador en graus (per defecte Cardedeu)
+    Retorna els arrays (N,) d'azimut i alçada en graus'''
+    r_eq = vector_sol_equatorial(vectors_origen)
+    Theta_G = calcular_temps_sideral_greenwich_vec(dates_utc)
+    return equatorial_a_horitzontal(r_eq, Theta_G, lat, lon)
+
+
+def vector_sol_local(azimuts, altures):
+    '''Vectors unitaris (..., 3) cap al sol en coordenades locals (Est, Nord, Zenit)
+    a partir de l'azimut (0=Nord, 90=Est) i l'alçada en graus'''
+    az, alt = np.radians(azimuts), np.radians(altures)
+    return np.stack([np.cos(alt) * np.sin(az), np.cos(alt) * np.cos(az), np.sin(alt)], axis=-1)
+
+def vector_normal_panell(inclinacio, azimut_panell):
+    '''Vector normal (..., 3) d'un panell amb inclinació (0=horitzontal) i
+    orientació (0=Nord, 180=Sud) en graus, en coordenades (Est, Nord, Zenit)'''
+    beta, gamma = np.radians(inclinacio), np.radians(azimut_panell)
+    return np.stack([np.sin(beta) * np.sin(gamma), np.sin(beta) * np.cos(gamma),
+                     np.cos(beta) * np.ones_like(gamma)], axis=-1)
+
+def cos_incidencia(azimuts, altures, inclinacio=0.0, azimut_panell=180.0):
+    '''Cosinus de l'angle d'incidència entre el sol i la normal del panell.
+    Per a un panell horitzontal és sin(alçada)'''
+    alt, beta = np.radians(altures), np.radians(inclinacio)
+    return (np.sin(alt) * np.cos(beta)
+            + np.cos(alt) * np.sin(beta) * np.cos(np.radians(azimuts - azimut_panell)))
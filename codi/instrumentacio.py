@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import atexit
+import runpy
+import argparse
+import functools
+import contextlib
+import numpy as np
+
+# Registre de temps i comptadors per etapa. S'activa amb la variable d'entorn
+# SOLAR_PERFIL o executant un script amb aquest mòdul. SOLAR_PERFIL=1 només mesura
+# les etapes; cprofile o tracemalloc hi afegeixen la captura detallada de captura(),
+# des que s'importa el primer mòdul instrumentat fins que acaba el procés.
+# Desactivat, cada funció instrumentada només comprova un booleà.
+VARIABLE_ENTORN = 'SOLAR_PERFIL'
+FITXER_PER_DEFECTE = 'perfil_execucio.json'
+
+_actiu = False
+_registre = {}
+_pila = [] # etapes obertes, per separar el temps propi del de les etapes internes
+
+
+def activar():
+    global _actiu
+    _actiu = True
+
+
+def desactivar():
+    global _actiu
+    _actiu = False
+
+
+def actiu():
+    return _actiu
+
+
+def reiniciar():
+    _registre.clear()
+
+
+def _mida_arrays(resultat):
+    # (elements de l'array més gran, bytes de tots els arrays) d'un resultat qualsevol
+    if isinstance(resultat, np.ndarray):
+        return resultat.size, resultat.nbytes
+    if isinstance(resultat, dict):
+        resultat = list(resultat.values())
+    if isinstance(resultat, (tuple, list)):
+        mides = [_mida_arrays(r) for r in resultat]
+        if mides:
+            return max(m[0] for m in mides), sum(m[1] for m in mides)
+    return 0, 0
+
+
+def _entrada(nom):
+    if nom not in _registre:
+        _registre[nom] = {'temps_s': 0.0, 'temps_propi_s': 0.0, 'crides': 0, 'mostres': 0, 'pic_arrays_MB': 0.0}
+    return _registre[nom]
+
+
+@contextlib.contextmanager
+def etapa(nom, mostres=None):
+    '''Mesura un bloc de codi com a etapa nom. mostres: quantes mostres processa'''
+    if not _actiu:
+        yield
+        return
+    _pila.append(0.0)
+    inici = time.perf_counter()
+    try:
+        yield
+    finally:
+        temps = time.perf_counter() - inici
+        internes = _pila.pop()
+        if _pila:
+            _pila[-1] += temps
+        entrada = _entrada(nom)
+        entrada['temps_s'] += temps
+        entrada['temps_propi_s'] += temps - internes
+        entrada['crides'] += 1
+        if mostres is not None:
+            entrada['mostres'] += int(mostres)
+
+
+def instrumentar(nom=None):
+    '''Decorador: registra temps, crides, mostres (elements de l'array més gran
+    retornat) i la mida màxima dels arrays retornats'''
+    def decorador(funcio):
+        nom_etapa = nom or f'{funcio.__module__}.{funcio.__qualname__}'
+
+        @functools.wraps(funcio)
+        def embolcall(*args, **kwargs):
+            if not _actiu:
+                return funcio(*args, **kwargs)
+            with etapa(nom_etapa):
+                resultat = funcio(*args, **kwargs)
+            mostres, octets = _mida_arrays(resultat)
+            entrada = _registre[nom_etapa]
+            entrada['mostres'] += mostres
+            entrada['pic_arrays_MB'] = max(entrada['pic_arrays_MB'], octets / 2**20)
+            return resultat
+        return embolcall
+    return decorador
+
+
+def perfil():
+    '''Còpia del registre, ordenada pel temps propi de cada etapa'''
+    return dict(sorted(((nom, dict(valors)) for nom, valors in _registre.items()),
+                       key=lambda element: -element[1]['temps_propi_s']))
+
+
+def resum():
+    '''Taula de text amb una fila per etapa'''
+    linies = [f"{'Etapa':45s} {'crides':>7s} {'total (s)':>10s} {'propi (s)':>10s} {'mostres':>12s} {'arrays (MB)':>12s}"]
+    for nom, valors in perfil().items():
+        linies.append(f"{nom:45s} {valors['crides']:7d} {valors['temps_s']:10.3f} {valors['temps_propi_s']:10.3f} "
+                      f"{valors['mostres']:12d} {valors['pic_arrays_MB']:12.1f}")
+    return '\n'.join(linies)
+
+
+def desar_json(fitxer=FITXER_PER_DEFECTE, extra=None):
+    '''Desa el perfil de l'execució (i dades extra, p.ex. la comanda) en JSON'''
+    with open(fitxer, 'w', encoding='utf-8') as f:
+        json.dump({'argv': sys.argv, 'etapes': perfil(), **(extra or {})}, f, indent=2, ensure_ascii=False)
+
+
+@contextlib.contextmanager
+def captura(mode=None, sortida=None):
+    '''Captura detallada opcional: 'cprofile' (funcions més costoses) o
+    'tracemalloc' (línies que reserven més memòria). Escriu l'informe a sortida'''
+    sortida = sortida or sys.stderr
+    if mode is None:
+        yield
+    elif mode == 'cprofile':
+        import cProfile
+        import pstats
+        perfilador = cProfile.Profile()
+        perfilador.enable()
+        try:
+            yield
+        finally:
+            perfilador.disable()
+            pstats.Stats(perfilador, stream=sortida).sort_stats('cumulative').print_stats(25)
+    elif mode == 'tracemalloc':
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            instantania = tracemalloc.take_snapshot()
+            _, pic = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"Pic de memòria: {pic / 2**20:.1f} MB", file=sortida)
+            for estadistica in instantania.statistics('lineno')[:15]:
+                print(estadistica, file=sortida)
+    else:
+        raise ValueError(f"Mode de captura desconegut: {mode}")
+
+
+_captura_entorn = contextlib.ExitStack()
+
+
+def _en_sortir():
+    _captura_entorn.close()
+    print(resum(), file=sys.stderr)
+    desar_json(os.environ.get(VARIABLE_ENTORN + '_JSON', FITXER_PER_DEFECTE))
+
+
+# Activació per variable d'entorn: en acabar el procés escrivim la captura (si n'hi
+# ha), el resum i el JSON
+if os.environ.get(VARIABLE_ENTORN, '') not in ('', '0'):
+    activar()
+    if os.environ[VARIABLE_ENTORN] in ('cprofile', 'tracemalloc'):
+        _captura_entorn.enter_context(captura(os.environ[VARIABLE_ENTORN]))
+    atexit.register(_en_sortir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Executa un script de codi/ amb la instrumentació activada")
+    parser.add_argument('--json', default=FITXER_PER_DEFECTE, help="fitxer del perfil")
+    parser.add_argument('--captura', choices=['cprofile', 'tracemalloc'], help="captura detallada opcional")
+    parser.add_argument('script')
+    parser.add_argument('arguments', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    # El mòdul s'executa com a __main__; els scripts importen 'instrumentacio', que
+    # és una altra instància: activem aquella
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    import instrumentacio
+    instrumentacio.activar()
+    sys.argv = [args.script] + args.arguments
+    inici = time.perf_counter()
+    with instrumentacio.captura(args.captura):
+        runpy.run_path(args.script, run_name='__main__')
+    print(instrumentacio.resum(), file=sys.stderr)
+    print(f"Temps total: {time.perf_counter() - inici:.2f} s", file=sys.stderr)
+    instrumentacio.desar_json(args.json, {'temps_total_s': time.perf_counter() - inici})
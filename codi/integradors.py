@@ -0,0 +1,68 @@
+import numpy as np
+
+# Coeficients de Yoshida (1990) per compondre tres passos de Verlet en un d'ordre 4
+_W1 = 1 / (2 - 2**(1/3))
+_W0 = -2**(1/3) / (2 - 2**(1/3))
+
+
+# --- MÈTODES SIMPLÈCTICS --- #
+# El problema radial té H = v^2/2 + V(r), amb V(r) = l^2/(2 r^2) + k/r, i theta és
+# la coordenada conjugada de l (constant). Separem H en "deriva" (r avança amb v)
+# i "impuls" (v i theta avancen segons r); cada part es pot fer exacta i per
+# això els mètodes conserven l'energia sense deriva secular.
+# impuls(r) ha de retornar (dtheta/dt, dv/dt) i treballar amb arrays.
+
+def pas_verlet(impuls, Y, h):
+    '''Un pas de velocity Verlet (impuls - deriva - impuls), ordre 2.
+    Y = (theta, r, v), amb qualsevol forma (3, ...)'''
+    theta, r, v = Y
+    dtheta, a = impuls(r)
+    theta = theta + h/2 * dtheta
+    v = v + h/2 * a
+    r = r + h * v
+    dtheta, a = impuls(r)
+    theta = theta + h/2 * dtheta
+    v = v + h/2 * a
+    return np.array([theta, r, v])
+
+def pas_yoshida4(impuls, Y, h):
+    '''Un pas de Yoshida d'ordre 4: tres passos de Verlet amb pesos w1, w0, w1'''
+    Y = pas_verlet(impuls, Y, _W1 * h)
+    Y = pas_verlet(impuls, Y, _W0 * h)
+    return pas_verlet(impuls, Y, _W1 * h)
+
+# Avaluacions de l'impuls per pas (per comparar el cost amb els altres mètodes)
+AVALUACIONS_PER_PAS = {'verlet': 2, 'yoshida4': 6, 'rk4': 4}
+
+
+def integrar_pas_fix(pas, Y0, h, t_final=np.inf, aturar=None):
+    '''Integra amb pas fix fins a t_final o fins al primer pas després del qual
+    aturar(Y) és cert. pas: funció (Y, h) -> Y. Retorna (t (n+1,), Y (n+1, 3))'''
+    Y = [np.asarray(Y0, dtype=float)]
+    t = [0.0]
+    while t[-1] < t_final and not (aturar is not None and aturar(Y[-1])):
+        Y.append(pas(Y[-1], h))
+        t.append(t[-1] + h)
+    return np.array(t), np.array(Y)
+
+
+def sortida_densa(t, Y, f):
+    '''Interpolació d'Hermite cúbica entre els passos: a cada node coneixem
+    l'estat i la derivada f(t, Y), així que podem avaluar en qualsevol instant
+    sense refinar el pas. Retorna una funció t -> Y (3, ...), com la de solve_ivp'''
+    from scipy.interpolate import CubicHermiteSpline
+    derivades = np.array([f(t_i, Y_i) for t_i, Y_i in zip(t, Y)])
+    return CubicHermiteSpline(t, Y.T, derivades.T, axis=1)
+
+
+# --- MÈTODES ADAPTATIUS --- #
+
+def integrar_adaptatiu(f, Y0, t_final, metode='DOP853', rtol=1e-10, atol=1e-12, esdeveniments=None):
+    '''Runge-Kutta encaixat amb control de l'error (RK45 o DOP853, de scipy).
+    El pas s'adapta sol i la solució porta la seva pròpia sortida densa
+    (resultat.sol(t)). esdeveniments: funcions g(t, Y) amb atribut terminal
+    per aturar la integració exactament on g = 0.
+    Retorna l'objecte de solve_ivp (t, y, sol, nfev, t_events...)'''
+    from scipy.integrate import solve_ivp
+    return solve_ivp(f, (0, t_final), Y0, method=metode, rtol=rtol, atol=atol,
+                     dense_output=True, events=esdeveniments)
@@ -0,0 +1,157 @@
+import numpy as np
+from func_canvibase import posiciosol_vectoritzat, LAT_CARDEDEU, LON_CARDEDEU
+from efemerides import EfemeridesTerra
+from zona_horaria import local_a_utc, ZONA_PER_DEFECTE
+from instrumentacio import instrumentar
+
+# Per sota d'aquesta resolució (minuts) la màscara de dia estalvia més del que costa
+# buscar la sortida i la posta; per sobre és més ràpid avaluar totes les mostres
+RESOLUCIO_MASCARA_DIA = 2
+# Entre dues hores, l'extrem de l'alçada pot quedar fins a ~0.5º de la mostra més propera
+MARGE_FREGAMENT = 1.0 # graus
+RAO_AURIA = (np.sqrt(5) - 1) / 2
+
+
+def usar_mascara_dia(nomes_dia, resolucio):
+    '''nomes_dia explícit, o si és None, només a les resolucions on surt a compte'''
+    return resolucio <= RESOLUCIO_MASCARA_DIA if nomes_dia is None else bool(nomes_dia)
+
+
+def coordenades_emplacament(emplacament):
+    '''(lat, lon, zona_horaria) d'un emplaçament, o els de Cardedeu si és None'''
+    if emplacament is None:
+        return LAT_CARDEDEU, LON_CARDEDEU, ZONA_PER_DEFECTE
+    return emplacament.lat, emplacament.lon, emplacament.zona_horaria
+
+
+@instrumentar()
+def sortida_posta(dies, emplacament=None, efemerides=None, altura_horitzo=0.0, iteracions=20):
+    '''Sortida i posta del sol per a cada dia local de l'array dies (datetime64[D]).
+
+    Avaluem l'alçada cada hora del dia i busquem tots els canvis de signe de
+    alçada - altura_horitzo, no només la primera sortida i la primera posta. Els
+    extrems entre hores prop de l'horitzó (el sol que el frega, a latituds polars)
+    es localitzen per secció àuria, perquè s'hi poden amagar dos creuaments. Tots
+    els intervals es refinen per bisecció alhora; amb 20 iteracions l'error és d'uns 3 ms.
+    Retorna un diccionari amb 'creuaments' (dies, M): tots els canvis de signe en
+    ordre (datetime64 UTC, NaT al final de la fila), 'sortida' (la primera) i 'posta'
+    (l'última), NaT si no n'hi ha, 'sol_a_inici', 'durada_hores' i 'sol_tot_el_dia' (dia polar)'''
+    lat, lon, zona = coordenades_emplacament(emplacament)
+    if efemerides is None:
+        efemerides = EfemeridesTerra()
+
+    def alcada(instants_ns):
+        instants_utc = np.asarray(instants_ns, dtype=np.int64).astype('datetime64[ns]')
+        _, alt = posiciosol_vectoritzat(efemerides.posicio(instants_utc), instants_utc, lat, lon)
+        return alt - altura_horitzo
+
+    dies = np.asarray(dies, dtype='datetime64[D]')
+    hores = local_a_utc(dies[:, None] + np.arange(25).astype('timedelta64[h]'), zona).astype('datetime64[ns]')
+    hores = hores.astype(np.int64)
+    valors = alcada(hores)
+
+    # Extrems entre dues hores prop de l'horitzó amb la mostra del costat contrari
+    central = valors[:, 1:-1]
+    pendent_abans, pendent_despres = central - valors[:, :-2], valors[:, 2:] - central
+    minim = (pendent_abans < 0) & (pendent_despres > 0)
+    maxim = (pendent_abans > 0) & (pendent_despres < 0)
+    fila, k = np.nonzero((np.abs(central) < MARGE_FREGAMENT) & ((minim & (central > 0)) | (maxim & (central <= 0))))
+    k += 1
+    extrem, valor_extrem = np.zeros(0, dtype=np.int64), np.zeros(0)
+    if len(fila):
+        extrem = _extrem(alcada, hores[fila, k - 1], hores[fila, k + 1], np.where(minim[fila, k - 1], 1.0, -1.0),
+                         2 * iteracions)
+        valor_extrem = alcada(extrem)
+        creua = (valor_extrem > 0) != (valors[fila, k] > 0)
+        fila, extrem, valor_extrem = fila[creua], extrem[creua], valor_extrem[creua]
+
+    # Graella de cada dia: les hores més els extrems (les files amb menys extrems
+    # repeteixen l'última hora, que no afegeix cap canvi de signe)
+    extres = np.bincount(fila, minlength=len(dies))
+    columna = np.arange(len(fila)) - np.repeat(np.cumsum(extres) - extres, extres)
+    instants = np.repeat(hores[:, -1:], 25 + extres.max(initial=0), axis=1)
+    alcades = np.repeat(valors[:, -1:], instants.shape[1], axis=1)
+    instants[:, :25], alcades[:, :25] = hores, valors
+    instants[fila, 25 + columna], alcades[fila, 25 + columna] = extrem, valor_extrem
+    ordre = np.argsort(instants, axis=1, kind='stable')
+    instants = np.take_along_axis(instants, ordre, axis=1)
+    sobre = np.take_along_axis(alcades, ordre, axis=1) > 0
+
+    # Tots els canvis de signe alhora, refinats per bisecció
+    fila, k = np.nonzero(sobre[:, :-1] != sobre[:, 1:])
+    abans, despres = instants[fila, k], instants[fila, k + 1]
+    signe_abans = sobre[fila, k]
+    for _ in range(iteracions):
+        mig = abans + (despres - abans) // 2
+        mateix = (alcada(mig) > 0) == signe_abans
+        abans = np.where(mateix, mig, abans)
+        despres = np.where(mateix, despres, mig)
+    instant = abans + (despres - abans) // 2
+
+    num = np.bincount(fila, minlength=len(dies))
+    columna = np.arange(len(fila)) - np.repeat(np.cumsum(num) - num, num)
+    creuaments = np.full((len(dies), num.max(initial=0)), np.datetime64('NaT'), dtype='datetime64[ns]')
+    creuaments[fila, columna] = instant.astype('datetime64[ns]')
+
+    # Primera sortida i última posta de cada dia (les files surten en ordre)
+    sortida = np.full(len(dies), np.datetime64('NaT'), dtype='datetime64[ns]')
+    posta = sortida.copy()
+    puja = ~signe_abans
+    dies_sortida, primera = np.unique(fila[puja], return_index=True)
+    sortida[dies_sortida] = instant[puja][primera]
+    dies_posta, ultima = np.unique(fila[~puja][::-1], return_index=True)
+    posta[dies_posta] = instant[~puja][::-1][ultima]
+
+    llum = {'creuaments': creuaments, 'sortida': sortida, 'posta': posta,
+            'sol_a_inici': sobre[:, 0], 'sol_tot_el_dia': sobre.all(axis=1)}
+    # Durada: trams entre l'inici del dia, els creuaments i el final; el sol
+    # canvia a cada creuament
+    limits = np.concatenate([hores[:, :1], np.where(np.isnat(creuaments), hores[:, -1:],
+                                                     creuaments.astype(np.int64)), hores[:, -1:]], axis=1)
+    amb_sol = llum['sol_a_inici'][:, None] ^ (np.arange(limits.shape[1] - 1) % 2 == 1)
+    llum['durada_hores'] = (np.diff(limits, axis=1) * amb_sol).sum(axis=1) / 3.6e12
+    return llum
+
+
+def _extrem(funcio, inici, final, signe, iteracions):
+    # Mínim (signe 1) o màxim (signe -1) de funcio a cada interval, per secció àuria
+    baix, alt = inici.astype(np.float64), final.astype(np.float64)
+    for _ in range(iteracions):
+        x1, x2 = alt - RAO_AURIA * (alt - baix), baix + RAO_AURIA * (alt - baix)
+        esquerra = signe * funcio(x1) < signe * funcio(x2)
+        alt, baix = np.where(esquerra, x2, alt), np.where(esquerra, baix, x1)
+    return ((baix + alt) / 2).astype(np.int64)
+
+
+def mascara_dia(dates_utc, llum):
+    '''Mostres (dia x instant) en què el sol és sobre l'horitzó: l'estat de l'inici
+    del dia local, canviat a cada creuament que ja ha passat'''
+    t = np.asarray(dates_utc, dtype='datetime64[ns]').astype(np.int64)
+    sobre = np.repeat(llum['sol_a_inici'][:, None], t.shape[1], axis=1)
+    for creuament in llum['creuaments'].T:
+        sobre ^= t >= np.where(np.isnat(creuament), np.iinfo(np.int64).max, creuament.astype(np.int64))[:, None]
+    return sobre
+
+
+@instrumentar()
+def posiciosol_dia(vectors_origen_fn, dates_utc, llum, lat=LAT_CARDEDEU, lon=LON_CARDEDEU):
+    '''Azimut i alçada només de les mostres diürnes; la resta queda a NaN.
+    vectors_origen_fn: funció que dona la posició de la Terra per a uns instants
+    (per exemple EfemeridesTerra().posicio). Si llum és None es calculen totes les mostres'''
+    if llum is None:
+        return posiciosol_vectoritzat(vectors_origen_fn(dates_utc), dates_utc, lat, lon)
+    dia = mascara_dia(dates_utc, llum)
+    azimuts = np.full(dia.shape, np.nan)
+    altures = np.full(dia.shape, np.nan)
+    instants = np.asarray(dates_utc, dtype='datetime64[ns]')[dia]
+    azimuts[dia], altures[dia] = posiciosol_vectoritzat(vectors_origen_fn(instants), instants, lat, lon)
+    return azimuts, altures
+
+
+if __name__ == '__main__':
+    dies = np.arange('2026-01-01', '2027-01-01', dtype='datetime64[D]')
+    llum = sortida_posta(dies)
+    for dia in ('2026-03-20', '2026-06-21', '2026-09-23', '2026-12-21'):
+        i = np.flatnonzero(dies == np.datetime64(dia))[0]
+        print(f"{dia}: sortida {llum['sortida'][i]} UTC, posta {llum['posta'][i]} UTC, "
+              f"{llum['durada_hores'][i]:.2f} h de sol")
@@ -0,0 +1,153 @@
+import os
+import csv
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from func_canvibase import (calcular_temps_sideral_greenwich_vec, vector_sol_equatorial,
+                            equatorial_a_horitzontal)
+from efemerides import EfemeridesTerra
+from zona_horaria import local_a_utc
+from calibracio import calibrar, factor_atmosferic
+from perdues import CadenaPerdues, temperatura_ambient
+from optimitzacio_panells import perfil_generacio_unitari, escombrat_panells
+from emplacament import llegir_emplacaments, CARDEDEU
+
+# Arrays compartits que cada procés veu després d'inicialitzar-se
+_compartits = {}
+
+
+def arrays_comuns(resolucio=10, any_=2026):
+    '''Part del càlcul de posició solar que no depèn de l'emplaçament: el vector Sol
+    en equatorials (N, 3) sobre una graella UTC de tot l'any, amb un dia de marge a
+    cada banda perquè hi càpiga l'hora local de qualsevol zona horària'''
+    inici = np.datetime64(f'{any_ - 1}-12-31', 'm')
+    final = np.datetime64(f'{any_ + 1}-01-02', 'm')
+    instants = np.arange(inici, final + resolucio, resolucio, dtype='datetime64[m]')
+    return {'r_eq': vector_sol_equatorial(EfemeridesTerra().posicio(instants))}
+
+
+def posicions_locals(emplacament, r_eq, resolucio=10, any_=2026):
+    '''Azimut i alçada (dies, instants) a la graella d'hora local de l'emplaçament,
+    com altures_any. El vector Sol s'interpola linealment a la graella UTC comuna
+    (exacte quan l'offset de la zona és múltiple de la resolució); el temps sideri
+    es calcula per a cada instant'''
+    dies = np.arange(f'{any_}-01-01', f'{any_ + 1}-01-01', dtype='datetime64[D]')
+    minuts = np.arange(0, 1440, resolucio)
+    dates_utc = local_a_utc(dies[:, None] + minuts.astype('timedelta64[m]'), emplacament.zona_horaria)
+    posicio = (dates_utc - np.datetime64(f'{any_ - 1}-12-31', 'm')) / np.timedelta64(resolucio, 'm')
+    i = np.floor(posicio).astype(int)
+    fraccio = (posicio - i)[..., None]
+    r_eq_local = r_eq[i] * (1 - fraccio) + r_eq[i + 1] * fraccio
+    Theta_G = calcular_temps_sideral_greenwich_vec(dates_utc)
+    azimuts, altures = equatorial_a_horitzontal(r_eq_local, Theta_G, emplacament.lat, emplacament.lon)
+    return dies, minuts, azimuts, altures
+
+
+def _crear_memoria_compartida(arrays):
+    # Copiem cada array a un bloc de memòria compartida i retornem (blocs, descripcions)
+    blocs, descripcio = [], {}
+    for nom, array in arrays.items():
+        bloc = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=bloc.buf)[...] = array
+        blocs.append(bloc)
+        descripcio[nom] = (bloc.name, array.shape, array.dtype.str)
+    return blocs, descripcio
+
+
+def _inicialitzar_proces(descripcio, model):
+    # Ens enganxem als blocs compartits sense copiar-los
+    for nom, (nom_bloc, forma, tipus) in descripcio.items():
+        bloc = shared_memory.SharedMemory(name=nom_bloc)
+        _compartits[nom] = np.ndarray(forma, dtype=tipus, buffer=bloc.buf)
+        _compartits['_bloc_' + nom] = bloc # mantenim la referència viva
+    _compartits['model'] = model
+
+
+def model_generacio(resolucio=10, any_=2026, perdues=CadenaPerdues()):
+    '''Paràmetres del model de generació d'optimitzacio_panells.optimitzar: la
+    transmitància calibrada amb PVGIS (de Cardedeu, l'única sèrie que tenim) i la
+    cadena de pèrdues amb el clima típic'''
+    return {'resolucio': resolucio, 'any': any_, 'transmitancia': calibrar()['transmitancia'],
+            'perdues': perdues}
+
+
+def avaluar_emplacament(emplacament, llista_panells=range(1, 16), arrays=None, model=None):
+    '''Nombre òptim de panells (pel VAN) i benefici d'un emplaçament a partir dels arrays comuns,
+    amb la mateixa generació que optimitzar(): graella d'hora local de la seva zona,
+    atenuació atmosfèrica calibrada i cadena de pèrdues'''
+    if arrays is None:
+        arrays, model = _compartits, _compartits['model']
+    resolucio = model['resolucio']
+    dies, minuts, _, altures = posicions_locals(emplacament, arrays['r_eq'], resolucio, model['any'])
+    mesos = dies.astype('datetime64[M]').astype(int) % 12
+    factor = factor_atmosferic(altures, mesos[:, None], model['transmitancia'])
+    temperatura = None if model['perdues'] is None else temperatura_ambient(dies, minuts)
+    generacio_unitaria = perfil_generacio_unitari(altures, factor_atmosferic=factor, perdues=model['perdues'],
+                                                  temperatura=temperatura)
+    resultat = escombrat_panells(generacio_unitaria, llista_panells, emplacament.consum_anual_kWh,
+                                 emplacament.preu_compra, emplacament.preu_venda,
+                                 emplacament.preu_panell, dt_h=resolucio / 60)
+    beneficis = resultat['benefici_net'][:, 0, 0]
+    idx = int(np.argmax(resultat['van'][:, 0, 0]))
+    return {
+        'nom': emplacament.nom,
+        'lat': emplacament.lat,
+        'lon': emplacament.lon,
+        'panells_optim': int(resultat['panells'][idx]),
+        'van': float(resultat['van'][idx, 0, 0]),
+        'benefici_net': float(beneficis[idx]),
+        'kwh_generats_any': float(generacio_unitaria.sum() * resultat['panells'][idx] * resolucio / 60 / 1000),
+        'autoconsum_percent': float(resultat['autoconsum_percent'][idx, 0]),
+    }
+
+
+def avaluar_lots(emplacaments, processos=None, resolucio=10, mida_lot=16, any_=2026, perdues=CadenaPerdues()):
+    '''Avalua molts emplaçaments en paral·lel. Els arrays comuns i la calibració es
+    calculen un sol cop; els arrays es comparteixen amb els processos per memòria compartida'''
+    model = model_generacio(resolucio, any_, perdues)
+    blocs, descripcio = _crear_memoria_compartida(arrays_comuns(resolucio, any_))
+    try:
+        with ProcessPoolExecutor(max_workers=processos, initializer=_inicialitzar_proces,
+                                 initargs=(descripcio, model)) as executor:
+            return list(executor.map(avaluar_emplacament, emplacaments, chunksize=mida_lot))
+    finally:
+        for bloc in blocs:
+            bloc.close()
+            bloc.unlink()
+
+
+def escriure_resultats(resultats, fitxer):
+    with open(fitxer, 'w', newline='', encoding='utf-8') as f:
+        escriptor = csv.DictWriter(f, fieldnames=list(resultats[0].keys()))
+        escriptor.writeheader()
+        escriptor.writerows(resultats)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Optimitza el nombre de panells per a molts emplaçaments")
+    parser.add_argument('entrada', nargs='?', help="CSV amb columnes nom, lat, lon, consum_anual_kWh, preu_compra, ...")
+    parser.add_argument('sortida', nargs='?', help="CSV de resultats")
+    parser.add_argument('--processos', type=int, default=os.cpu_count())
+    parser.add_argument('--resolucio', type=int, default=10, help="minuts entre mostres")
+    parser.add_argument('--comprovar', action='store_true',
+                        help="comprova que el lot d'un sol emplaçament (Cardedeu) dona el mateix que optimitzar()")
+    args = parser.parse_args()
+
+    if args.comprovar:
+        from optimitzacio_panells import optimitzar
+        lot = avaluar_lots([CARDEDEU], 1)[0]
+        referencia = optimitzar()
+        i = referencia['idx_optim']
+        print(f"Lot: {lot['panells_optim']} panells, VAN {lot['van']:.2f} €; "
+              f"optimitzar(): {referencia['panells'][i]} panells, VAN {referencia['van'][i]:.2f} €")
+        assert lot['panells_optim'] == referencia['panells'][i]
+        assert np.isclose(lot['van'], referencia['van'][i], rtol=1e-6)
+        assert np.isclose(lot['benefici_net'], referencia['benefici_net'][i], rtol=1e-6)
+        parser.exit(message="El lot coincideix amb optimitzar()\n")
+    if args.entrada is None or args.sortida is None:
+        parser.error("calen entrada i sortida (o --comprovar)")
+
+    resultats = avaluar_lots(llegir_emplacaments(args.entrada), args.processos, args.resolucio)
+    escriure_resultats(resultats, args.sortida)
+    print(f"{len(resultats)} emplaçaments avaluats -> {args.sortida}")
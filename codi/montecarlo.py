@@ -0,0 +1,168 @@
+import os
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from calibracio import calibrar, massa_aire, altures_dies_representatius
+from optimitzacio_panells import (altures_any, CONSTANT_SOLAR, CONSUM_ANUAL_LLAR,
+                                  PREU_COMPRA_XARXA, PREU_VENDA_EXCEDENT, PREU_PANELL, POTENCIA_PIC_PANELL)
+from economia import (analisi_economica, ESCALAT_PREU_COMPRA, COST_INVERSOR_WP)
+from perdues import CadenaPerdues, aplicar_perdues, temperatura_ambient
+
+# --- Incerteses per defecte --- #
+SIGMA_INTERANUAL = 0.05 # variació relativa de la irradiància d'un any a un altre
+SIGMA_CONSUM = 0.15 # relativa
+SIGMA_PREU_COMPRA = 0.04 # €/kWh
+SIGMA_PREU_VENDA = 0.02 # €/kWh
+MARGE_DEGRADACIO = (0.003, 0.008) # uniforme, per any
+SIGMA_ESCALAT = 0.015 # punts de l'escalat anual del preu de compra
+
+MIDA_BLOC = 64 # mostres per bloc (limita la memòria); cada bloc té la seva llavor i es pot fer en un altre procés
+ALTURA_MINIMA_TAU = 10 # graus: per sota, la massa d'aire fa la tau horària massa sorollosa
+
+_dades = {}
+
+
+def taus_horaries(pvgis=None):
+    '''Estimació de la transmitància a cada hora de PVGIS, tau_h = (G / model)^(1 / massa d'aire).
+    Retorna una llista de 12 arrays (un per mes) amb les hores amb prou sol'''
+    resultat = calibrar(pvgis)
+    altures = altures_dies_representatius()
+    am = massa_aire(altures)
+    taus = []
+    for mes in range(12):
+        valides = (altures[mes] > ALTURA_MINIMA_TAU) & (resultat['pvgis'][mes] > 0)
+        taus.append((resultat['pvgis'][mes, valides] / resultat['model'][mes, valides]) ** (1 / am[mes, valides]))
+    return resultat['transmitancia'], taus
+
+
+def mostres_transmitancia(rng, n, transmitancia, taus):
+    '''Bootstrap: per a cada mostra i mes tornem a triar les hores amb reemplaçament
+    i escalem la tau calibrada amb la mitjana remostrejada. Retorna (n, 12)'''
+    mostres = np.empty((n, 12))
+    for mes, taus_mes in enumerate(taus):
+        remostreig = taus_mes[rng.integers(0, len(taus_mes), size=(n, len(taus_mes)))]
+        mostres[:, mes] = transmitancia[mes] * remostreig.mean(axis=1) / taus_mes.mean()
+    return np.clip(mostres, 0.0, 1.0)
+
+
+def preparar(resolucio=10, any_=2026, perdues=CadenaPerdues()):
+    '''Dades comunes a totes les mostres: potència d'un panell sense atmosfera ni
+    límit de potència pic, massa d'aire, mes i temperatura ambient de cada mostra
+    diürna (la nit no aporta res i no la guardem), i la cadena de pèrdues'''
+    _, altures = altures_any(resolucio, any_=any_)
+    dies = np.arange(f'{any_}-01-01', f'{any_ + 1}-01-01', dtype='datetime64[D]')
+    mesos = np.broadcast_to((dies.astype('datetime64[M]').astype(int) % 12)[:, None], altures.shape)
+    dia = np.nan_to_num(altures, nan=-90.0) > 0
+    transmitancia, taus = taus_horaries()
+    return {
+        'generacio': CONSTANT_SOLAR * np.sin(np.radians(altures[dia])) * POTENCIA_PIC_PANELL / 1000,
+        'massa_aire': massa_aire(altures[dia]),
+        'mes': mesos[dia],
+        'temperatura': temperatura_ambient(dies, np.arange(0, 1440, resolucio))[dia],
+        'perdues': perdues,
+        'transmitancia': transmitancia,
+        'taus': taus,
+        'dt_h': resolucio / 60,
+    }
+
+
+def _inicialitzar_proces(dades):
+    _dades.update(dades)
+
+
+def avaluar_bloc(llavor, n, panells, dades=None):
+    '''Mostreja n casos amb la llavor donada i calcula energia i economia de tots de cop.
+    Retorna un diccionari d'arrays (n,)'''
+    if dades is None:
+        dades = _dades
+    rng = np.random.default_rng(llavor)
+    tau = mostres_transmitancia(rng, n, dades['transmitancia'], dades['taus'])
+    interanual = rng.lognormal(0.0, SIGMA_INTERANUAL, n)
+    consum_kWh = CONSUM_ANUAL_LLAR * rng.lognormal(0.0, SIGMA_CONSUM, n)
+    preu_compra = np.maximum(rng.normal(PREU_COMPRA_XARXA, SIGMA_PREU_COMPRA, n), 0.0)
+    preu_venda = np.maximum(rng.normal(PREU_VENDA_EXCEDENT, SIGMA_PREU_VENDA, n), 0.0)
+    degradacio = rng.uniform(*MARGE_DEGRADACIO, n)
+    escalat = rng.normal(ESCALAT_PREU_COMPRA, SIGMA_ESCALAT, n)
+
+    # Generació de totes les mostres alhora (n, mostres diürnes), en W; el límit
+    # de potència pic s'aplica després de l'atmosfera, com a perfil_generacio_unitari
+    generacio = dades['generacio'] * tau[:, dades['mes']] ** dades['massa_aire'] * interanual[:, None]
+    potencia = np.minimum(generacio, POTENCIA_PIC_PANELL)
+    if dades['perdues'] is not None:
+        irradiancia = generacio * 1000 / POTENCIA_PIC_PANELL
+        potencia = aplicar_perdues(potencia, irradiancia, dades['temperatura'], POTENCIA_PIC_PANELL,
+                                   dades['perdues'])
+    generacio = panells * potencia
+    consum_W = consum_kWh * 1000 / (365 * 24)
+    # De nit tot el consum ve de la xarxa; de dia, min(generació, consum)
+    kwh_generats = generacio.sum(axis=1) * dades['dt_h'] / 1000
+    kwh_autoconsum = np.minimum(generacio, consum_W[:, None]).sum(axis=1) * dades['dt_h'] / 1000
+    kwh_excedent = kwh_generats - kwh_autoconsum
+
+    economia = analisi_economica(kwh_autoconsum, kwh_excedent, panells * PREU_PANELL,
+                                 preu_compra=preu_compra, preu_venda=preu_venda,
+                                 degradacio=degradacio, escalat_compra=escalat,
+                                 cost_inversor=panells * POTENCIA_PIC_PANELL * COST_INVERSOR_WP)
+    return {
+        'kwh_any': kwh_generats,
+        'kwh_autoconsum': kwh_autoconsum,
+        'van': economia['van'],
+        'retorn_descomptat_anys': economia['retorn_descomptat_anys'],
+    }
+
+
+def simular(n_mostres=10000, panells=15, processos=None, llavor=0, resolucio=10,
+            perdues=CadenaPerdues()):
+    '''Monte Carlo de n_mostres casos per a una instal·lació de panells panells.
+    Els casos es reparteixen en blocs de MIDA_BLOC; cada bloc rep una llavor
+    derivada de llavor amb SeedSequence, així el resultat és el mateix
+    independentment del nombre de processos. processos=1 no crea cap procés.
+    perdues: cadena de pèrdues (None per a la potència ideal)
+    Retorna un diccionari amb els arrays de totes les mostres'''
+    dades = preparar(resolucio, perdues=perdues)
+    mides = [min(MIDA_BLOC, n_mostres - inici) for inici in range(0, n_mostres, MIDA_BLOC)]
+    llavors = np.random.SeedSequence(llavor).spawn(len(mides))
+    if processos == 1:
+        blocs = [avaluar_bloc(s, n, panells, dades) for s, n in zip(llavors, mides)]
+    else:
+        with ProcessPoolExecutor(max_workers=processos, initializer=_inicialitzar_proces,
+                                 initargs=(dades,)) as executor:
+            blocs = list(executor.map(avaluar_bloc, llavors, mides, [panells] * len(mides)))
+    return {clau: np.concatenate([bloc[clau] for bloc in blocs]) for clau in blocs[0]}
+
+
+def percentils(valors, exces=True):
+    '''P10, P50 i P90. Amb exces (energia, VAN) P90 és el valor que se supera el 90% de
+    les vegades (percentil 10); sense (retorn) és el que no s'excedeix el 90% de les vegades.
+    Les mostres NaN (p.ex. sense retorn dins la vida útil) són el pitjor cas, -inf o +inf,
+    i compten: si hi cau un percentil, és infinit. Fem servir el quantil empíric
+    (sense interpolar) perquè la interpolació amb infinits no està definida'''
+    valors = np.asarray(valors, dtype=float)
+    valors = np.where(np.isnan(valors), -np.inf if exces else np.inf, valors)
+    p10, p50, p90 = np.percentile(valors, [90, 50, 10] if exces else [10, 50, 90], method='inverted_cdf')
+    return {'P10': p10, 'P50': p50, 'P90': p90}
+
+
+def _format_percentil(valor):
+    # +inf només surt dels retorns que no arriben dins la vida útil
+    return f"{'> vida útil':>11s}" if valor == np.inf else f"{valor:11.1f}"
+
+
+if __name__ == '__main__':
+    import time
+    parser = argparse.ArgumentParser(description="Incertesa de producció i economia (Monte Carlo)")
+    parser.add_argument('--mostres', type=int, default=20000)
+    parser.add_argument('--panells', type=int, default=15)
+    parser.add_argument('--processos', type=int, default=os.cpu_count())
+    parser.add_argument('--llavor', type=int, default=0)
+    args = parser.parse_args()
+
+    inici = time.perf_counter()
+    resultat = simular(args.mostres, args.panells, args.processos, args.llavor)
+    print(f"{args.mostres} mostres en {time.perf_counter() - inici:.1f} s")
+    for clau, nom, exces in [('kwh_any', 'Producció (kWh/any)', True), ('van', 'VAN (€)', True),
+                             ('retorn_descomptat_anys', 'Retorn descomptat (anys)', False)]:
+        p = percentils(resultat[clau], exces)
+        print(f"{nom:26s} P90 {_format_percentil(p['P90'])}  P50 {_format_percentil(p['P50'])}  "
+              f"P10 {_format_percentil(p['P10'])}")
+    print(f"Sense retorn dins la vida útil: {np.mean(np.isnan(resultat['retorn_descomptat_anys'])) * 100:.1f}%")
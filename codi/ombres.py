@@ -0,0 +1,102 @@
+import csv
+import argparse
+import numpy as np
+
+# Resolució de la taula d'horitzó (graus d'azimut per casella)
+PAS_TAULA = 1.0
+# Punts per aresta quan projectem els obstacles propers sobre el cel
+PUNTS_ARESTA = 200
+
+
+def llegir_horitzo(fitxer, col_azimut='azimut', col_elevacio='elevacio'):
+    '''Perfil d'horitzó d'un CSV (p.ex. d'un aixecament): azimut i elevació en graus.
+    Retorna (azimuts, elevacions) ordenats per azimut'''
+    azimuts, elevacions = [], []
+    with open(fitxer, newline='', encoding='utf-8') as f:
+        for fila in csv.DictReader(f):
+            azimuts.append(float(fila[col_azimut]))
+            elevacions.append(float(fila[col_elevacio]))
+    ordre = np.argsort(azimuts)
+    return np.array(azimuts)[ordre] % 360, np.array(elevacions)[ordre]
+
+
+def taula_horitzo(azimuts=None, elevacions=None, obstacles=(), pas=PAS_TAULA):
+    '''Taula d'elevació mínima visible per a cada casella d'azimut [0, 360).
+    Combina el perfil d'horitzó (interpolat circularment) i els obstacles propers.
+    obstacles: llista de polígons (n, 3) amb vèrtexs (est, nord, alçada) en metres
+    respecte del panell; cada polígon tapa des de la seva silueta fins a terra.
+    Retorna un array (360 / pas,) en graus'''
+    caselles = np.arange(0, 360, pas)
+    if azimuts is None:
+        taula = np.zeros(len(caselles))
+    else:
+        taula = np.interp(caselles, azimuts, elevacions, period=360)
+    for poligon in obstacles:
+        taula = np.maximum(taula, _silueta_obstacle(np.asarray(poligon, dtype=float), pas))
+    return taula
+
+
+def _silueta_obstacle(poligon, pas):
+    # Projectem les arestes del polígon (tancat) a (azimut, elevació) i ens quedem
+    # amb l'elevació màxima a cada casella d'azimut
+    inici, final = poligon, np.roll(poligon, -1, axis=0)
+    s = np.linspace(0, 1, PUNTS_ARESTA)[:, None, None]
+    punts = (inici + s * (final - inici)).reshape(-1, 3)
+    est, nord, alcada = punts.T
+    azimut = np.degrees(np.arctan2(est, nord)) % 360
+    elevacio = np.degrees(np.arctan2(alcada, np.hypot(est, nord)))
+    silueta = np.zeros(int(round(360 / pas)))
+    np.maximum.at(silueta, (azimut / pas).astype(int) % len(silueta), elevacio)
+    return silueta
+
+
+def elevacio_horitzo(taula, azimuts):
+    '''Elevació de l'horitzó a cada azimut, interpolant linealment la taula.
+    Una consulta per mostra (O(mostres)), sense cap test geomètric'''
+    pas = 360 / len(taula)
+    posicio = np.asarray(azimuts) % 360 / pas
+    i = np.floor(posicio).astype(int) % len(taula)
+    fraccio = posicio - np.floor(posicio)
+    return taula[i] * (1 - fraccio) + taula[(i + 1) % len(taula)] * fraccio
+
+
+def mascara_sol(taula, azimuts, altures):
+    '''Cert on el sol és per sobre de l'horitzó i dels obstacles (False on hi ha NaN)'''
+    azimuts = np.nan_to_num(azimuts)
+    return np.nan_to_num(altures, nan=-90.0) > elevacio_horitzo(taula, azimuts)
+
+
+def perdua_mensual(potencia, potencia_ombra, dies):
+    '''Fracció d'energia perduda per ombres a cada mes.
+    potencia i potencia_ombra: arrays (dies, instants); dies: datetime64[D]
+    Retorna un array (12,) (NaN als mesos sense dies)'''
+    mesos = np.asarray(dies, dtype='datetime64[D]').astype('datetime64[M]').astype(int) % 12
+    sense = np.bincount(mesos, np.asarray(potencia).sum(axis=1), minlength=12)
+    amb = np.bincount(mesos, np.asarray(potencia_ombra).sum(axis=1), minlength=12)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 1 - amb / sense
+
+
+if __name__ == '__main__':
+    from optimitzacio_panells import altures_any, perfil_generacio_unitari
+
+    parser = argparse.ArgumentParser(description="Pèrdues per ombres d'un horitzó i obstacles propers")
+    parser.add_argument('horitzo', nargs='?', help="CSV amb columnes azimut, elevacio (graus)")
+    args = parser.parse_args()
+
+    if args.horitzo:
+        taula = taula_horitzo(*llegir_horitzo(args.horitzo))
+    else:
+        # Exemple: serralada a l'est i un edifici veí de 10 m d'alçada al sud-oest, a 15 m
+        serra = (np.array([0, 60, 90, 120, 180, 360]), np.array([2, 8, 12, 6, 3, 2]))
+        edifici = [(-10, -12, 10), (-20, -5, 10), (-20, -5, 0), (-10, -12, 0)]
+        taula = taula_horitzo(*serra, obstacles=[edifici])
+
+    azimuts, altures = altures_any()
+    dies = np.arange('2026-01-01', '2027-01-01', dtype='datetime64[D]')
+    potencia = perfil_generacio_unitari(altures).reshape(altures.shape)
+    potencia_ombra = potencia * mascara_sol(taula, azimuts, altures)
+    perdues = perdua_mensual(potencia, potencia_ombra, dies)
+    for mes, perdua in enumerate(perdues, start=1):
+        print(f"Mes {mes:2d}: {perdua * 100:5.1f}% perdut per ombres")
+    print(f"Any: {(1 - potencia_ombra.sum() / potencia.sum()) * 100:.1f}%")
@@ -1,41 +1,11 @@
 import numpy as np
-import datetime
-import matplotlib.pyplot as plt
-import trajectoria
-from func_canvibase import posiciosol
-from posiciosolcardedeu import obtenir_offset
-
-#generació de dades solars
-#dades trajectòria Terra
-x_tierra = trajectoria.x 
-y_tierra = trajectoria.y
-z_tierra = np.zeros(len(x_tierra))
-
-dia_periheli = datetime.date(2026, 1, 3)
-lists_altures = []
-
-#fem un bucle per als 365 dies de l'any
-dies_any = [datetime.date(2026, 1, 1) + datetime.timedelta(days=i) for i in range(365)]
-
-for dia in dies_any:
-    #busquem posició de la Terra avui
-    delta = dia - dia_periheli
-    idx = delta.days % len(x_tierra)
-    vec_terra = np.array([x_tierra[idx], y_tierra[idx], z_tierra[idx]])
-    
-    offset = obtenir_offset(dia)
-    altures_dia = []
-    
-    #bucle de minuts (cada 10 minuts)
-    for minut in range(0, 1440, 10):
-        hora_local = datetime.datetime(dia.year, dia.month, dia.day) + datetime.timedelta(minutes=minut)
-        data_utc = hora_local - datetime.timedelta(hours=offset)
-        
-        #càlcul posició
-        az, alt = posiciosol(vec_terra, data_utc)
-        altures_dia.append(alt)
-        
-    lists_altures.append(altures_dia)
+from func_canvibase import cos_incidencia
+from zona_horaria import local_a_utc
+from llum_dia import coordenades_emplacament, sortida_posta, posiciosol_dia, usar_mascara_dia
+import cache_solar
+from perdues import aplicar_perdues, temperatura_ambient
+from ombres import mascara_sol
+from instrumentacio import instrumentar
 
 #paràmetres tècnics i economics
 PREU_PANELL = 600.0       # € (inclou panell, inversor proporcional i instal·lació)
@@ -47,20 +17,64 @@ CONSUM_ANUAL_LLAR = 3500  # kWh/any (consum típic família 4 persones)
 CONSTANT_SOLAR = 1362.0   # W/m^2
 POTENCIA_PIC_PANELL = 400.0 # W
 
-#perfil de generació per 1 panell
-#agafem les llistes de 'posiciosolcardedeu' i calculem quanta energia fa un panell durant tot l'any minut a minut.
+#màxim d'elements que creem de cop amb perfils de consum variables
+MAX_ELEMENTS = 2**23
 
-potencia_1_panell_minutal = []
 
-#iterem sobre les llistes d'altures
-for alt_dia in lists_altures:
-    alts = np.array(alt_dia)
-    
-    #el sol sota l'horitzó no suma
-    alts = np.maximum(alts, 0)
-    
-    #irradiancia = I_0 * sin(altura) per placa horitzontal
-    irrad = CONSTANT_SOLAR * np.sin(np.radians(alts))
+@instrumentar()
+def altures_any(resolucio=10, efemerides=None, emplacament=None, any_=2026, nomes_dia=None,
+                usar_cache=True):
+    '''Azimut i alçada del sol (arrays dia x instant, en hora local) per a tots els dies de l'any.
+    emplacament: objecte amb atributs lat, lon i zona_horaria (per defecte Cardedeu)
+    nomes_dia: només calcula les mostres entre la sortida i la posta; la resta queden a NaN.
+    Per defecte (None) només a les resolucions on surt a compte.
+    Amb l'efemèride per defecte el resultat surt de cache_solar (arrays de només lectura)'''
+    nomes_dia = usar_mascara_dia(nomes_dia, resolucio)
+    #generació de dades solars
+    #dades trajectòria Terra
+    if efemerides is None:
+        dies = (np.datetime64(f'{any_ + 1}-01-01') - np.datetime64(f'{any_}-01-01')).astype(int)
+        posicions = cache_solar.posicions(f'{any_}-01-01', dies, resolucio, emplacament,
+                                          nomes_dia, usar_cache)
+        return posicions['azimuts'], posicions['altures']
+
+    #els dies de l'any
+    dies_any = np.arange(f'{any_}-01-01', f'{any_ + 1}-01-01', dtype='datetime64[D]')
+
+    #instants UTC (cada 'resolucio' minuts)
+    minuts = np.arange(0, 1440, resolucio)
+    hores_locals = dies_any[:, None] + minuts.astype('timedelta64[m]')
+    lat, lon, zona = coordenades_emplacament(emplacament)
+    dates_utc = local_a_utc(hores_locals, zona)
+
+    #càlcul posició de tot l'any de cop (posició de la Terra a cada instant)
+    llum = sortida_posta(dies_any, emplacament, efemerides) if nomes_dia else None
+    return posiciosol_dia(efemerides.posicio, dates_utc, llum, lat, lon)
+
+
+@instrumentar()
+def perfil_generacio_unitari(altures, azimuts=None, inclinacio=0.0, azimut_panell=180.0,
+                             factor_atmosferic=1.0, perdues=None, temperatura=None, horitzo=None, dies=None):
+    '''Potència (W) d'un sol panell a cada instant de l'any, com a vector llarg.
+    Per defecte el panell és horitzontal; amb inclinacio > 0 cal passar els azimuts.
+    factor_atmosferic: atenuació per mostra (veure calibracio.factor_atmosferic)
+    perdues: perdues.CadenaPerdues per passar a potència alterna real; temperatura
+    és l'ambient (ºC) a cada mostra; si és None, el clima típic sobre la graella
+    dies x instants del dia, i llavors cal passar dies (datetime64[D], un per fila d'altures)
+    horitzo: taula d'elevació de l'horitzó (veure ombres.taula_horitzo); cal passar els azimuts'''
+    if inclinacio == 0:
+        #irradiancia = I_0 * sin(altura) per placa horitzontal
+        cos_inc = np.sin(np.radians(altures))
+    else:
+        #irradiancia sobre el pla del panell
+        cos_inc = cos_incidencia(azimuts, altures, inclinacio, azimut_panell)
+
+    #el sol sota l'horitzó no suma, i la cara posterior del panell tampoc
+    irrad = np.where(altures > 0, CONSTANT_SOLAR * np.maximum(cos_inc, 0) * factor_atmosferic, 0.0)
+
+    #muntanyes, edificis i obstacles: el sol darrere l'horitzó tampoc suma
+    if horitzo is not None:
+        irrad = np.where(mascara_sol(horitzo, azimuts, altures), irrad, 0.0)
     
     #potència = Irradiancia * (Eficiència/Area...) 
     #simplificació: Regla de tres amb la potència pic (a 1000 W/m^2 treu 400W)
@@ -68,87 +82,203 @@ for alt_dia in lists_altures:
     
     #el panell no pot donar més de 400W encara que hi hagi molt sol
     pot = np.minimum(pot, POTENCIA_PIC_PANELL)
-    
-    potencia_1_panell_minutal.extend(pot) #afegim al vector llarg de tot l'any
 
-#convertim a array de numpy per operar ràpid
-generacio_unitaria = np.array(potencia_1_panell_minutal)
+    #temperatura, cablejat, brutícia, mismatch i inversor
+    if perdues is not None:
+        if temperatura is None:
+            if dies is None:
+                raise ValueError("Amb perdues cal passar la temperatura o els dies de la graella")
+            temperatura = temperatura_ambient(dies, np.arange(altures.shape[1]) * 1440 / altures.shape[1])
+        pot = aplicar_perdues(pot, irrad, temperatura, POTENCIA_PIC_PANELL, perdues)
 
-#perfil de consum
-#per fer l'optimització realista, necessitem saber quan consumim.
-num_minuts = len(generacio_unitaria)
+    return pot.ravel()
 
-#consum base constant
-consum_base_W = (CONSUM_ANUAL_LLAR * 1000) / (365 * 24)
-consum_real_W = np.full(num_minuts, consum_base_W)
 
-#bucle d'optimitzacio
-llista_panells = range(1, 16) #provarem d'1 a 15 panells
-beneficis_nets = []
-autoconsum_percent = []
+@instrumentar()
+def escombrat_panells(generacio_unitaria, llista_panells=range(1, 16),
+                      consums_anuals_kWh=CONSUM_ANUAL_LLAR,
+                      preus_compra=PREU_COMPRA_XARXA, preus_venda=PREU_VENDA_EXCEDENT,
+                      preu_panell=PREU_PANELL, vida_util=VIDA_UTIL, dt_h=10/60,
+                      perfils_consum_W=None):
+    '''Avalua tota la graella panells x nivells de consum x escenaris de preus de cop.
+
+    Amb consum constant c i N panells, l'energia autoconsumida és
+    suma(min(N*g, c)) = N * suma(g < c/N) + c * #(g >= c/N). Ordenant la
+    generació un sol cop i fent la suma acumulada, cada parell (N, c) costa
+    una cerca binària. L'economia és lineal en els kWh, així que els
+    escenaris de preus (preus_compra[i], preus_venda[i], preu_panell[i]) són
+    només un producte extern.
+
+    perfils_consum_W: perfils de consum reals alineats amb la generació, (C, T) o
+    directament el (C, dies, instants) de perfil_consum (T = mida de la
+    generació). Si es passa, substitueix els nivells constants i l'autoconsum es
+    calcula mostra a mostra per trams.
+
+    'benefici_net' és el flux de l'any 1 per la vida útil menys la inversió (sense
+    descompte ni degradació); 'van' és el valor actual net d'economia, el criteri
+    per triar el nombre de panells.
+
+    Retorna un diccionari amb les coordenades ('panells', 'consum_anual_kWh',
+    'preu_compra', 'preu_venda') i els arrays amb dimensions a 'dims'.'''
+    from economia import valor_actual_net, COST_INVERSOR_WP
+    panells = np.asarray(llista_panells, dtype=float)
+    consums_anuals_kWh = np.atleast_1d(np.asarray(consums_anuals_kWh, dtype=float))
+    preus_compra = np.atleast_1d(np.asarray(preus_compra, dtype=float))
+    preus_venda = np.atleast_1d(np.asarray(preus_venda, dtype=float))
+    preus_compra, preus_venda, preu_panell = np.broadcast_arrays(preus_compra, preus_venda, preu_panell)
+
+    #generació ordenada i suma acumulada (amb un zero al davant)
+    g_ordenada = np.sort(generacio_unitaria)
+    suma_acumulada = np.concatenate([[0.0], np.cumsum(g_ordenada)])
+    num_mostres = g_ordenada.size
+
+    N = panells[:, None]
+    if perfils_consum_W is None:
+        #consum base constant (W) per a cada nivell
+        consum_W = consums_anuals_kWh * 1000 / (365 * 24)
+
+        #balanç energètic instantani (sumat a tot l'any), graella (panells, consum)
+        llindar = consum_W[None, :] / N
+        idx = np.searchsorted(g_ordenada, llindar, side='left')
+        suma_autoconsum_W = N * suma_acumulada[idx] + consum_W[None, :] * (num_mostres - idx)
+        suma_consum_W = consum_W * num_mostres
+    else:
+        #perfils variables: min(N*g_t, c_t) mostra a mostra, per trams de temps
+        perfils_consum_W = np.asarray(perfils_consum_W, dtype=float)
+        if perfils_consum_W.ndim == 1:
+            perfils_consum_W = perfils_consum_W[None, :]
+        perfils_consum_W = perfils_consum_W.reshape(len(perfils_consum_W), -1)
+        if perfils_consum_W.shape[1] != num_mostres:
+            raise ValueError(f"Els perfils de consum tenen {perfils_consum_W.shape[1]} mostres per client i la "
+                             f"generació {num_mostres}: han de ser de la mateixa graella (dies x instants)")
+        suma_autoconsum_W = np.zeros((len(panells), len(perfils_consum_W)))
+        mida_tram = max(1, MAX_ELEMENTS // suma_autoconsum_W.size)
+        for inici in range(0, num_mostres, mida_tram):
+            g = generacio_unitaria[inici:inici + mida_tram]
+            c = perfils_consum_W[:, inici:inici + mida_tram]
+            suma_autoconsum_W += np.minimum(N[:, :, None] * g, c[None, :, :]).sum(axis=-1)
+        suma_consum_W = perfils_consum_W.sum(axis=1)
+        consums_anuals_kWh = suma_consum_W * dt_h / 1000
+    suma_generacio_W = N * suma_acumulada[-1]
 
-for N in llista_panells:
-    #generació total amb N panells
-    generacio_total = generacio_unitaria * N
-    
-    #balanç energètic instantani
-    # energia que aprofitem directament es el mínim entre el que produïm i el que necessitem
-    energia_autoconsumida_W = np.minimum(generacio_total, consum_real_W)
-    
-    #energia que ens sobra
-    energia_excedent_W = np.maximum(generacio_total - consum_real_W, 0)
-    
     #passem de Potència (W) a Energia (kWh) anual
-    kwh_autoconsum = np.sum(energia_autoconsumida_W) / 6000
-    kwh_excedent = np.sum(energia_excedent_W) / 6000
-    
-    # balanç economic
-    #estalviem el preu de compra pel que autoconsumim
-    estalvi_factura = kwh_autoconsum * PREU_COMPRA_XARXA
-    #guanyem el preu de venda pel que donem a la xarxa
-    pagament_excedents = kwh_excedent * PREU_VENDA_EXCEDENT
-    
-    flux_caixa_anual = estalvi_factura + pagament_excedents
-    
-    #càlcul a llarg termini (25 anys)
-    inversio_inicial = N * PREU_PANELL
-    benefici_total = (flux_caixa_anual * VIDA_UTIL) - inversio_inicial
-    
-    beneficis_nets.append(benefici_total)
-    
-    #% d'independència de la xarxa
-    total_consum_kwh = np.sum(consum_real_W) / 6000
-    autoconsum_percent.append((kwh_autoconsum / total_consum_kwh) * 100)
-
-#gràfic
-#busquem el màxim
-idx_optim = np.argmax(beneficis_nets)
-num_optim = llista_panells[idx_optim]
-benefici_maxim = beneficis_nets[idx_optim]
-
-plt.figure(figsize=(10, 6))
-
-#pintem la corba de benefici
-plt.plot(llista_panells, beneficis_nets, marker='o', linestyle='-', color='teal', label='Benefici Net (25 anys)')
-
-#marquem el punt òptim
-plt.scatter([num_optim], [benefici_maxim], color='red', s=100, zorder=5, label=f'Òptim: {num_optim} panells')
-plt.axvline(num_optim, color='red', linestyle='--', alpha=0.3)
-
-plt.title('Optimització Econòmica del Nombre de Panells', fontsize=14)
-plt.xlabel('Nombre de Panells (N)', fontsize=12)
-plt.ylabel('Benefici Net Acumulat (€)', fontsize=12)
-plt.grid(True, alpha=0.5)
-plt.legend()
-plt.xticks(llista_panells)
-
-#text explicatiu al gràfic
-plt.text(num_optim + 0.5, benefici_maxim, 
-         f"Màxim Benefici: {benefici_maxim:.0f} €\nAutoconsum: {autoconsum_percent[idx_optim]:.1f}%", 
-         verticalalignment='top')
-
-plt.tight_layout()
-plt.savefig('figures/optimitzacio_panells.png')
-plt.show()
-
-print(f"Resultat: El nombre òptim és {num_optim} panells.")
\ No newline at end of file
+    kwh_autoconsum = suma_autoconsum_W * dt_h / 1000
+    kwh_excedent = (suma_generacio_W - suma_autoconsum_W) * dt_h / 1000
+    total_consum_kwh = suma_consum_W * dt_h / 1000
+
+    # balanç economic (panells, consum, escenari)
+    flux_caixa_anual = (kwh_autoconsum[..., None] * preus_compra
+                        + kwh_excedent[..., None] * preus_venda)
+    inversio_inicial = N[..., None] * preu_panell
+    benefici_net = flux_caixa_anual * vida_util - inversio_inicial
+    van = valor_actual_net(kwh_autoconsum[..., None], kwh_excedent[..., None], inversio_inicial,
+                           preu_compra=preus_compra, preu_venda=preus_venda, vida_util=vida_util,
+                           cost_inversor=N[..., None] * POTENCIA_PIC_PANELL * COST_INVERSOR_WP)
+
+    return {
+        'dims': ('panells', 'consum_anual_kWh', 'escenari'),
+        'panells': panells.astype(int),
+        'consum_anual_kWh': consums_anuals_kWh,
+        'preu_compra': preus_compra,
+        'preu_venda': preus_venda,
+        'kwh_autoconsum': kwh_autoconsum,
+        'kwh_excedent': kwh_excedent,
+        'autoconsum_percent': kwh_autoconsum / total_consum_kwh * 100,
+        'flux_caixa_anual': flux_caixa_anual,
+        'benefici_net': benefici_net,
+        'van': van,
+    }
+
+
+def optimitzar(llista_panells=range(1, 16), perdues=None, objectiu='van'):
+    '''Escombrat amb l'atmosfera calibrada i l'economia de la vida útil per al
+    consum i els preus per defecte. perdues: per defecte la CadenaPerdues típica.
+    objectiu: 'van' (valor actual net) o 'benefici_net' (sense descompte), el que
+    es maximitza per triar l'òptim.
+    Retorna el resultat d'escombrat_panells amb 'van', 'benefici_net' i
+    'autoconsum_percent' per panells, l'òptim i l'analisi_economica'''
+    if objectiu not in ('van', 'benefici_net'):
+        raise ValueError(f"Objectiu desconegut: {objectiu}")
+    from calibracio import calibrar, factor_atmosferic
+    from perdues import CadenaPerdues
+    from economia import analisi_economica, COST_INVERSOR_WP
+
+    azimuts, altures = altures_any()
+    dies = np.arange('2026-01-01', '2027-01-01', dtype='datetime64[D]')
+
+    #atenuació atmosfèrica calibrada amb PVGIS, segons el mes de cada dia
+    mesos = dies.astype('datetime64[M]').astype(int) % 12
+    factor = factor_atmosferic(altures, mesos[:, None], calibrar()['transmitancia'])
+
+    #convertim a array de numpy per operar ràpid (amb la cadena de pèrdues fins a alterna)
+    generacio_unitaria = perfil_generacio_unitari(altures, factor_atmosferic=factor,
+                                                  perdues=CadenaPerdues() if perdues is None else perdues,
+                                                  dies=dies)
+
+    #bucle d'optimitzacio, ara vectoritzat
+    resultat = escombrat_panells(generacio_unitaria, llista_panells)
+    resultat['benefici_net'] = resultat['benefici_net'][:, 0, 0]
+    resultat['van'] = resultat['van'][:, 0, 0]
+    resultat['autoconsum_percent'] = resultat['autoconsum_percent'][:, 0]
+    resultat['idx_optim'] = int(np.argmax(resultat[objectiu]))
+
+    #economia al llarg de la vida útil (degradació, descompte, preus i inversor)
+    panells = resultat['panells']
+    resultat['economia'] = analisi_economica(resultat['kwh_autoconsum'][:, 0], resultat['kwh_excedent'][:, 0],
+                                             panells * PREU_PANELL,
+                                             cost_inversor=panells * POTENCIA_PIC_PANELL * COST_INVERSOR_WP)
+    return resultat
+
+
+def grafica_optimitzacio(resultat, fitxer='figures/optimitzacio_panells.png'):
+    import matplotlib.pyplot as plt
+    llista_panells = resultat['panells']
+    vans = resultat['van']
+    autoconsum_percent = resultat['autoconsum_percent']
+
+    #gràfic
+    #busquem el màxim
+    idx_optim = resultat['idx_optim']
+    num_optim = llista_panells[idx_optim]
+    van_optim = vans[idx_optim]
+
+    plt.figure(figsize=(10, 6))
+
+    #pintem la corba del VAN
+    plt.plot(llista_panells, vans, marker='o', linestyle='-', color='teal', label=f'VAN ({VIDA_UTIL} anys)')
+
+    #marquem el punt òptim
+    plt.scatter([num_optim], [van_optim], color='red', s=100, zorder=5, label=f'Òptim: {num_optim} panells')
+    plt.axvline(num_optim, color='red', linestyle='--', alpha=0.3)
+
+    plt.title('Optimització Econòmica del Nombre de Panells', fontsize=14)
+    plt.xlabel('Nombre de Panells (N)', fontsize=12)
+    plt.ylabel('Valor Actual Net (€)', fontsize=12)
+    plt.grid(True, alpha=0.5)
+    plt.legend()
+    plt.xticks(llista_panells)
+
+    #text explicatiu al gràfic
+    plt.text(num_optim + 0.5, van_optim,
+             f"VAN màxim: {van_optim:.0f} €\nAutoconsum: {autoconsum_percent[idx_optim]:.1f}%", 
+             verticalalignment='top')
+
+    plt.tight_layout()
+    plt.savefig(fitxer)
+
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    resultat = optimitzar()
+    grafica_optimitzacio(resultat)
+    plt.show()
+
+    idx_optim = resultat['idx_optim']
+    num_optim = resultat['panells'][idx_optim]
+    economia = resultat['economia']
+    print(f"Resultat: El nombre òptim és {num_optim} panells.")
+    print(f"Amb {num_optim} panells: VAN {economia['van'][idx_optim]:.0f} €, "
+          f"TIR {economia['tir'][idx_optim] * 100:.1f}%, "
+          f"retorn descomptat {economia['retorn_descomptat_anys'][idx_optim]:.1f} anys, "
+          f"LCOE {economia['lcoe'][idx_optim] * 100:.1f} c€/kWh")
\ No newline at end of file
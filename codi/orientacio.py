@@ -0,0 +1,83 @@
+import numpy as np
+from func_canvibase import vector_sol_local, vector_normal_panell
+from optimitzacio_panells import altures_any, CONSTANT_SOLAR, POTENCIA_PIC_PANELL
+
+# Mida dels blocs d'orientacions que avaluem de cop (limita la memòria)
+MIDA_BLOC = 128
+
+
+def energia_orientacions(azimuts, altures, inclinacions, azimuts_panell, dt_h=10/60):
+    '''Energia anual (kWh) d'un panell per a moltes orientacions alhora.
+
+    Reutilitza les posicions del sol ja calculades: només ens quedem amb les
+    mostres diürnes, i el cosinus d'incidència per a totes les orientacions és
+    un producte de matrius (orientacions x 3) @ (3 x mostres).
+    inclinacions i azimuts_panell s'han de poder combinar per broadcasting;
+    el resultat té la seva forma.'''
+    sol = altures > 0
+    vectors_sol = vector_sol_local(azimuts[sol], altures[sol]).astype(np.float32)
+
+    inclinacions, azimuts_panell = np.broadcast_arrays(inclinacions, azimuts_panell)
+    normals = vector_normal_panell(inclinacions.ravel(), azimuts_panell.ravel()).astype(np.float32)
+
+    # Mateix model que perfil_generacio_unitari: P = min(I_0 * cos * Ppic/1000, Ppic),
+    # que equival a P = I_0 * Ppic/1000 * clip(cos, 0, 1000/I_0)
+    factor = CONSTANT_SOLAR * POTENCIA_PIC_PANELL / 1000.0
+    cos_maxim = 1000.0 / CONSTANT_SOLAR
+
+    energia = np.empty(len(normals))
+    for inici in range(0, len(normals), MIDA_BLOC):
+        cos_inc = normals[inici:inici + MIDA_BLOC] @ vectors_sol.T
+        np.clip(cos_inc, 0, cos_maxim, out=cos_inc)
+        energia[inici:inici + MIDA_BLOC] = cos_inc.sum(axis=1, dtype=np.float64) * factor * dt_h / 1000
+
+    return energia.reshape(inclinacions.shape)
+
+
+def mapa_orientacio(azimuts, altures, pas=1.0, dt_h=10/60):
+    '''Mapa d'energia anual (kWh/panell) per a inclinacions 0-90º i orientacions 0-360º.
+    Retorna (inclinacions, azimuts_panell, energia[inclinacio, azimut])'''
+    inclinacions = np.arange(0, 90 + pas / 2, pas)
+    azimuts_panell = np.arange(0, 360, pas)
+    energia = energia_orientacions(azimuts, altures, inclinacions[:, None], azimuts_panell[None, :], dt_h)
+    return inclinacions, azimuts_panell, energia
+
+
+def optimitzar_orientacio(azimuts, altures, dt_h=10/60, pas_inicial=10.0, pas_final=0.1):
+    '''Cerca de gruixut a fi de la millor inclinació i orientació.
+    A cada nivell avaluem una graella 5x5 vegades més fina al voltant del millor punt.
+    Retorna (inclinacio, azimut_panell, energia_kWh)'''
+    inclinacions, azimuts_panell, energia = mapa_orientacio(azimuts, altures, pas_inicial, dt_h)
+    i, j = np.unravel_index(np.argmax(energia), energia.shape)
+    millor_inc, millor_az = inclinacions[i], azimuts_panell[j]
+
+    pas = pas_inicial
+    while pas > pas_final:
+        pas_nou = max(pas / 5, pas_final)
+        inclinacions = np.clip(millor_inc + np.arange(-pas, pas + pas_nou / 2, pas_nou), 0, 90)
+        azimuts_panell = (millor_az + np.arange(-pas, pas + pas_nou / 2, pas_nou)) % 360
+        energia = energia_orientacions(azimuts, altures, inclinacions[:, None], azimuts_panell[None, :], dt_h)
+        i, j = np.unravel_index(np.argmax(energia), energia.shape)
+        millor_inc, millor_az = inclinacions[i], azimuts_panell[j]
+        pas = pas_nou
+
+    return millor_inc, millor_az, energia[i, j]
+
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    azimuts, altures = altures_any()
+    inclinacions, azimuts_panell, energia = mapa_orientacio(azimuts, altures)
+    inc, az, e_max = optimitzar_orientacio(azimuts, altures)
+    print(f"Orientació òptima: inclinació {inc:.1f}º, azimut {az:.1f}º ({e_max:.0f} kWh/panell/any)")
+
+    plt.figure(figsize=(10, 6))
+    plt.contourf(azimuts_panell, inclinacions, energia, levels=30, cmap='viridis')
+    plt.colorbar(label='Energia anual per panell (kWh)')
+    plt.scatter([az], [inc], color='red', s=60, label='Òptim')
+    plt.xlabel('Azimut del panell (Graus, 180 = Sud)')
+    plt.ylabel('Inclinació (Graus)')
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig('figures/orientacio_panells.png', bbox_inches='tight')
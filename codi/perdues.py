@@ -0,0 +1,75 @@
+import numpy as np
+from dataclasses import dataclass
+from instrumentacio import instrumentar
+
+# Clima de Cardedeu aproximat: temperatura mitjana mensual (ºC) i oscil·lació diària
+TEMPERATURA_MITJANA_MENSUAL = np.array([8.5, 9.5, 12.0, 14.0, 17.5, 21.5, 24.5, 24.5, 21.0, 17.0, 12.0, 9.0])
+OSCIL_LACIO_DIARIA = np.array([9.0, 9.0, 9.5, 9.5, 10.0, 10.0, 10.0, 9.5, 9.0, 8.5, 8.5, 8.5])
+HORA_MAXIMA = 15.0 # hora local de la temperatura màxima
+
+# Inversor (PVWatts v5): corba d'eficiència de referència
+EFICIENCIA_REFERENCIA_INVERSOR = 0.9637
+
+
+@dataclass(frozen=True)
+class CadenaPerdues:
+    '''Paràmetres de la cadena de pèrdues des de la irradiància fins a la potència alterna'''
+    model_temperatura: str = 'noct' # 'noct' o 'faiman'
+    noct: float = 45.0 # ºC a 800 W/m^2, 20 ºC i 1 m/s
+    u0: float = 25.0 # W/m^2K (Faiman)
+    u1: float = 6.84 # W s/m^3K (Faiman)
+    vent: float = 1.0 # m/s
+    coef_temperatura: float = -0.0035 # per ºC respecte de 25 ºC
+    cablejat: float = 0.02
+    bruticia: float = 0.02
+    mismatch: float = 0.02
+    eficiencia_inversor: float = 0.96 # nominal
+    ratio_dc_ac: float = 1.1 # potència pic / potència nominal de l'inversor
+
+
+def temperatura_ambient(dies, minuts):
+    '''Temperatura ambient (ºC) a la graella dia x instant local: mitjana del mes
+    més una sinusoide diària amb el màxim a HORA_MAXIMA.
+    dies: array datetime64[D]; minuts: minuts des de mitjanit'''
+    mesos = np.asarray(dies, dtype='datetime64[D]').astype('datetime64[M]').astype(int) % 12
+    fase = 2*np.pi * (np.asarray(minuts) / 60 - HORA_MAXIMA) / 24
+    return (TEMPERATURA_MITJANA_MENSUAL[mesos][:, None]
+            + OSCIL_LACIO_DIARIA[mesos][:, None] / 2 * np.cos(fase)[None, :])
+
+
+def temperatura_cel_la(irradiancia, temperatura_ambient, cadena=CadenaPerdues()):
+    '''Temperatura de cèl·lula (ºC) segons el model NOCT o el de Faiman'''
+    if cadena.model_temperatura == 'noct':
+        return temperatura_ambient + (cadena.noct - 20.0) / 800.0 * irradiancia
+    if cadena.model_temperatura == 'faiman':
+        return temperatura_ambient + irradiancia / (cadena.u0 + cadena.u1 * cadena.vent)
+    raise ValueError(f"Model de temperatura desconegut: {cadena.model_temperatura}")
+
+
+def eficiencia_inversor(carrega, cadena=CadenaPerdues()):
+    '''Eficiència de l'inversor segons la fracció de potència DC nominal (PVWatts v5).
+    A càrrega zero (de nit) retorna 0'''
+    carrega = np.asarray(carrega, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eta = (cadena.eficiencia_inversor / EFICIENCIA_REFERENCIA_INVERSOR
+               * (-0.0162 * carrega - 0.0059 / carrega + 0.9858))
+    return np.where(carrega > 0, np.maximum(eta, 0.0), 0.0)
+
+
+@instrumentar()
+def aplicar_perdues(potencia_dc_W, irradiancia, temperatura_ambient, potencia_pic_W, cadena=CadenaPerdues()):
+    '''Potència alterna (W) a partir de la potència DC ideal (a 25 ºC, sense pèrdues).
+    Tot són operacions element a element sobre la graella: temperatura de
+    cèl·lula, coeficient de temperatura, cablejat/brutícia/mismatch i inversor
+    (amb la seva corba d'eficiència i el límit de potència nominal)'''
+    t_cel_la = temperatura_cel_la(irradiancia, temperatura_ambient, cadena)
+    dc = (potencia_dc_W * (1 + cadena.coef_temperatura * (t_cel_la - 25.0))
+          * (1 - cadena.cablejat) * (1 - cadena.bruticia) * (1 - cadena.mismatch))
+    potencia_inversor_dc = potencia_pic_W / cadena.ratio_dc_ac / cadena.eficiencia_inversor
+    ac = dc * eficiencia_inversor(dc / potencia_inversor_dc, cadena)
+    return np.clip(ac, 0.0, potencia_pic_W / cadena.ratio_dc_ac)
+
+
+def performance_ratio(energia_ac_kWh, irradiacio_kWh_m2, potencia_pic_kW):
+    '''Performance ratio: energia real / energia ideal a 1000 W/m^2 (IEC 61724)'''
+    return energia_ac_kWh / (irradiacio_kWh_m2 * potencia_pic_kW)
@@ -0,0 +1,182 @@
+import csv
+import math
+import argparse
+import numpy as np
+from zona_horaria import utc_a_local, ZONA_PER_DEFECTE
+
+# Files de CSV que llegim i processem de cop; limita la memòria de la lectura
+MIDA_TROS = 200_000
+
+DIES_ANY = 365
+
+
+def llegir_trossos(fitxers, col_instant='timestamp', col_energia='kWh', col_client=None,
+                   delimitador=',', mida_tros=MIDA_TROS):
+    '''Llegeix lectures de comptador (un o més CSV) a trossos de mida_tros files.
+    Si no hi ha col_client, el client és el nom del fitxer.
+    Genera tuples (clients, instants, kwh) d'arrays numpy: identificador (str),
+    inici de l'interval (datetime64[s], tal com ve al fitxer) i energia (kWh)'''
+    if isinstance(fitxers, str):
+        fitxers = [fitxers]
+    for fitxer in fitxers:
+        with open(fitxer, newline='', encoding='utf-8') as f:
+            lector = csv.reader(f, delimiter=delimitador)
+            capcalera = [nom.strip() for nom in next(lector)]
+            i_instant, i_energia = capcalera.index(col_instant), capcalera.index(col_energia)
+            i_client = capcalera.index(col_client) if col_client is not None else None
+            clients, instants, energies = [], [], []
+            for fila in lector:
+                if not fila:
+                    continue
+                instants.append(fila[i_instant].strip())
+                energies.append(fila[i_energia])
+                if i_client is not None:
+                    clients.append(fila[i_client].strip())
+                if len(instants) == mida_tros:
+                    yield _tros(fitxer, clients, instants, energies)
+                    clients, instants, energies = [], [], []
+            if instants:
+                yield _tros(fitxer, clients, instants, energies)
+
+
+def _tros(fitxer, clients, instants, energies):
+    # Passem les llistes d'un tros a arrays; les lectures buides són NaN
+    instants = np.array(instants, dtype='datetime64[s]')
+    kwh = np.array([float(e.replace(',', '.')) if e.strip() else np.nan for e in energies])
+    clients = np.array(clients) if clients else np.full(len(instants), fitxer)
+    return clients, instants, kwh
+
+
+def _trossos_amb_interval(fitxers, interval_minuts=None, **opcions_lectura):
+    '''Com llegir_trossos, sense les lectures buides i amb l'interval (minuts) de
+    cada tros: el donat o, si és None, el deduït per a cada fitxer com el salt
+    mínim entre instants diferents. Els trossos d'un fitxer s'esperen fins que
+    n'hi ha prou per deduir-lo.
+    Genera tuples (clients, instants, kwh, interval_minuts)'''
+    if isinstance(fitxers, str):
+        fitxers = [fitxers]
+    for fitxer in fitxers:
+        interval = interval_minuts
+        pendents, vistos = [], np.zeros(0, dtype='datetime64[s]')
+        for clients, instants, kwh in llegir_trossos(fitxer, **opcions_lectura):
+            valides = ~np.isnan(kwh)
+            pendents.append((clients[valides], instants[valides], kwh[valides]))
+            if interval is None:
+                vistos = np.unique(np.concatenate([vistos, instants[valides]]))
+                if len(vistos) < 2:
+                    continue
+                interval = int(np.diff(vistos).min().astype(np.int64) // 60)
+                if interval < 1:
+                    raise ValueError(f"{fitxer}: lectures a menys d'un minut de distància; "
+                                     f"cal passar interval_minuts")
+            for tros in pendents:
+                yield tros + (interval,)
+            pendents = []
+        if pendents:
+            raise ValueError(f"{fitxer}: no es pot deduir l'interval de les lectures "
+                             f"(menys de dos instants diferents); cal passar interval_minuts")
+
+
+def _dia_any(instants_locals):
+    # Dia de l'any (0..364) ignorant el 29 de febrer, que retornem a -1
+    dies = instants_locals.astype('datetime64[D]')
+    anys = dies.astype('datetime64[Y]')
+    dia = (dies - anys.astype('datetime64[D]')).astype(np.int64)
+    any_num = anys.astype(np.int64) + 1970
+    traspas = (any_num % 4 == 0) & ((any_num % 100 != 0) | (any_num % 400 == 0))
+    return np.where(traspas & (dia == 59), -1, np.where(traspas & (dia > 59), dia - 1, dia))
+
+
+def perfils_consum(fitxers, resolucio=10, interval_minuts=None, hora_utc=False,
+                   zona=ZONA_PER_DEFECTE, **opcions_lectura):
+    '''Perfils de consum mitjans (W) de tots els clients dels fitxers, sobre la
+    graella de la simulació: 365 dies x (1440 / resolucio) instants en hora local.
+
+    Les lectures (energia de cada interval de interval_minuts, 15 o 60 típicament;
+    si és None es dedueix per a cada fitxer) es reparteixen uniformement dins
+    l'interval i s'acumulen per client, dia de l'any i instant del dia amb
+    bincount, tros a tros: la memòria només depèn del nombre de clients.
+    Alineem per hora local: si hora_utc, els instants es passen abans a la zona.
+    Així l'hora repetida de la tardor es promedia i el forat de primavera queda
+    buit. Amb dades de diversos anys cada casella és la mitjana de tots; les
+    caselles sense cap lectura prenen la mitjana del client a la mateixa hora.
+    opcions_lectura: es passen a llegir_trossos (noms de columna, delimitador...)
+    Retorna un diccionari amb 'clients' (llista), 'consum_W' (C, 365, instants)
+    i 'cobertura' (fracció de caselles amb dades, per client)'''
+    instants_dia = 1440 // resolucio
+    caselles = DIES_ANY * instants_dia
+    index_client = {}
+    energia = np.zeros(0)  # kWh acumulats per casella
+    minuts = np.zeros(0)  # minuts de lectura acumulats per casella
+
+    for clients, instants, kwh, interval in _trossos_amb_interval(fitxers, interval_minuts, **opcions_lectura):
+        if hora_utc:
+            instants = utc_a_local(instants, zona)
+
+        # Clients nous: ampliem els acumuladors
+        noms, inversa = np.unique(clients, return_inverse=True)
+        for nom in noms:
+            index_client.setdefault(str(nom), len(index_client))
+        idx_client = np.array([index_client[str(nom)] for nom in noms])[inversa]
+        if len(index_client) * caselles > energia.size:
+            falten = len(index_client) * caselles - energia.size
+            energia = np.concatenate([energia, np.zeros(falten)])
+            minuts = np.concatenate([minuts, np.zeros(falten)])
+
+        # Repartim cada interval en subpassos que encaixen amb la graella
+        pas = math.gcd(interval, resolucio)
+        subpassos = interval // pas
+        inici = np.repeat(instants, subpassos) + np.tile(np.arange(0, interval, pas),
+                                                         len(instants)).astype('timedelta64[m]')
+        dia = _dia_any(inici)
+        minut_dia = (inici - inici.astype('datetime64[D]')).astype('timedelta64[m]').astype(np.int64)
+        casella = (np.repeat(idx_client, subpassos) * caselles + dia * instants_dia
+                   + minut_dia // resolucio)
+        valides = dia >= 0
+        energia += np.bincount(casella[valides], np.repeat(kwh / subpassos, subpassos)[valides],
+                               minlength=energia.size)
+        minuts += np.bincount(casella[valides], minlength=minuts.size) * pas
+
+    energia = energia.reshape(-1, DIES_ANY, instants_dia)
+    minuts = minuts.reshape(energia.shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        consum_W = energia * 1000 / (minuts / 60)
+        # Caselles buides: mitjana del client a la mateixa hora del dia
+        mitjana_hora = energia.sum(axis=1) * 1000 / (minuts.sum(axis=1) / 60)
+    consum_W = np.where(minuts > 0, consum_W, np.nan_to_num(mitjana_hora)[:, None, :])
+    return {
+        'clients': list(index_client),
+        'consum_W': consum_W,
+        'cobertura': (minuts > 0).mean(axis=(1, 2)),
+    }
+
+
+if __name__ == '__main__':
+    from optimitzacio_panells import altures_any, perfil_generacio_unitari, escombrat_panells
+
+    parser = argparse.ArgumentParser(description="Optimitza els panells amb el consum real de comptadors")
+    parser.add_argument('fitxers', nargs='+', help="CSV de lectures (instant, kWh i opcionalment client)")
+    parser.add_argument('--col-instant', default='timestamp')
+    parser.add_argument('--col-energia', default='kWh')
+    parser.add_argument('--col-client', default=None)
+    parser.add_argument('--delimitador', default=',')
+    parser.add_argument('--utc', action='store_true', help="els instants del fitxer són UTC")
+    parser.add_argument('--resolucio', type=int, default=10, help="minuts entre mostres")
+    parser.add_argument('--interval', type=int, default=None,
+                        help="minuts de cada lectura (per defecte es dedueix de cada fitxer)")
+    args = parser.parse_args()
+
+    perfils = perfils_consum(args.fitxers, args.resolucio, args.interval, hora_utc=args.utc,
+                             col_instant=args.col_instant, col_energia=args.col_energia,
+                             col_client=args.col_client, delimitador=args.delimitador)
+    _, altures = altures_any(args.resolucio)
+    generacio_unitaria = perfil_generacio_unitari(altures)
+    resultat = escombrat_panells(generacio_unitaria, dt_h=args.resolucio / 60, perfils_consum_W=perfils['consum_W'])
+
+    for c, client in enumerate(perfils['clients']):
+        vans = resultat['van'][:, c, 0]
+        i = int(np.argmax(vans))
+        print(f"{client}: {resultat['consum_anual_kWh'][c]:.0f} kWh/any, "
+              f"{resultat['panells'][i]} panells -> VAN {vans[i]:.0f} € "
+              f"(autoconsum {resultat['autoconsum_percent'][i, c]:.1f}%, "
+              f"cobertura {perfils['cobertura'][c] * 100:.0f}%)")
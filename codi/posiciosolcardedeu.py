@@ -1,28 +1,15 @@
 import numpy as np
 import datetime
-import matplotlib.pyplot as plt
-import trajectoria
-from func_canvibase import posiciosol
+from zona_horaria import offset_hores, ZONA_PER_DEFECTE
+import cache_solar
 
 #--- DADES TRAJECTÒRIA TERRA --- #
-x_tierra = trajectoria.x 
-y_tierra = trajectoria.y
-#numpy zeros és més ràpid i net
-z_tierra = np.zeros(len(x_tierra))
+# (el periheli de referència, 3 de Gener de 2026, és a efemerides.DIA_PERIHELI;
+# la posició del sol de tot l'any es calcula un sol cop i es guarda a cache_solar)
 
-# --- Configuració Inicial --- #
-# Definim el dia del periheli (Considerem que és el 3 de Gener de 2026)
-dia_periheli = datetime.date(2026, 1, 3) 
-
-#dates del canvi d'hora hivern/estiu pel 2026:
-inici_estiu= datetime.date(2026, 3, 29)
-fi_estiu= datetime.date(2026, 10, 26)
-
-def obtenir_offset(data):
-    #retorna 2h si és horari d'estiu i 1h si és hivern
-    if data>=inici_estiu and data < fi_estiu:
-        return 2
-    return 1
+def obtenir_offset(data, zona=ZONA_PER_DEFECTE):
+    #retorna 2h si és horari d'estiu i 1h si és hivern (a migdia, per a qualsevol any)
+    return int(offset_hores(np.datetime64(data, 'D') + np.timedelta64(12, 'h'), zona))
 
 
 # Grafiquem la posició del sol pel dia que vulguem
@@ -31,78 +18,79 @@ def corba_posicio(mes, dia):
     #Escollim el dia
     data_plot = datetime.date(2026, mes, dia)
 
-    # Calculem la diferencia de dies respecte el periheli
-    delta = data_plot - dia_periheli
-    #fem el mòdul per assegurar de no passar-nos de 365
-    idx= delta.days % len(x_tierra)
-
-    # Coordenades de la terra en aquest dia (UA)
-    vector_posicio= np.array([x_tierra[idx], y_tierra[idx], z_tierra[idx]])
-
-    az_plot = []
-    alt_plot = []
-
-    marques_hores = []
-
     offset= obtenir_offset(data_plot)
 
-    # --- Bucle --- #
-    for minut in range(0, 24 * 60, 10):
-        # 1. Crear l'hora local
-        hora_local=datetime.datetime(2026, mes, dia) + datetime.timedelta(minutes=minut)
+    # --- Instants del dia --- #
+    # 1. Crear l'hora local
+    minuts = np.arange(0, 24 * 60, 10)
+
+    # 2-3. Azimut i alçada: fila del dia a la graella de tot l'any (cache_solar),
+    # calculada també de nit perquè dibuixem fins a -10 graus
+    inici_any = datetime.date(data_plot.year, 1, 1)
+    dies_any = (datetime.date(data_plot.year + 1, 1, 1) - inici_any).days
+    posicions = cache_solar.posicions(inici_any, dies_any, 10, nomes_dia=False)
+    dia_any = data_plot.timetuple().tm_yday - 1
+    azimuts, altures = posicions['azimuts'][dia_any], posicions['altures'][dia_any]
+
+    #4. Filtrar
+    visible = altures > -10
+    az_plot = list(azimuts[visible])
+    alt_plot = list(altures[visible])
+    marques_hores = [(az, alt, f'{m // 60:02d}:00')
+                     for az, alt, m in zip(az_plot, alt_plot, minuts[visible]) if m % 60 == 0]
 
-        data_utc = hora_local - datetime.timedelta(hours=offset)
+    return az_plot, alt_plot, marques_hores, offset
 
-        # 3. Calcular azimut i alçada
-        az, alt = posiciosol(vector_posicio, data_utc)
+MESOS = {"Gener": 1, "Febrer": 2, "Març": 3, "Abril": 4, "Maig": 5, "Juny": 6, "Juliol": 7, "Agost": 8, "Septembre": 9, 
+         "Octubre": 10, "Novembre": 11, "Desembre": 12} #Diccionari amb els noms dels mesos
+MESOS_CORBES = {key: val for key, val in MESOS.items() if val % 2 != 0} #Fem una corba cada dos mesos
 
-        #4. Filtrar
-        if alt > -10:
-            az_plot.append(az)
-            alt_plot.append(alt)
-            if hora_local.minute == 0:
-                 marques_hores.append((az, alt, hora_local.strftime('%H:%M')))
 
+def corbes_posicio(dia=1):
+    '''Corba del sol pel dia indicat de cada dos mesos (Gener, Març, ...).
+    Retorna un diccionari nom del mes -> resultat de corba_posicio'''
+    return {key: corba_posicio(val, dia) for key, val in MESOS_CORBES.items()}
 
-    return az_plot, alt_plot, marques_hores, offset
 
-# --- Gràfica --- #
-plt.figure(figsize=(10, 6))
+def grafica_trajectoria_solar(corbes, fitxer='figures/trajectoriasolar.png', dia=1):
+    import matplotlib.pyplot as plt
 
-mesos = {"Gener": 1, "Febrer": 2, "Març": 3, "Abril": 4, "Maig": 5, "Juny": 6, "Juliol": 7, "Agost": 8, "Septembre": 9, 
-         "Octubre": 10, "Novembre": 11, "Desembre": 12} #Diccionari amb els noms dels mesos
+    # --- Gràfica --- #
+    plt.figure(figsize=(10, 6))
+
+    #Fem una corba pel primer de cada dos mesos
+    for key, corba in corbes.items():
+        azimuts, altures, llista_hores, off_h = corba
 
-#Fem una corba pel primer de cada dos mesos
-for key, val in mesos.items():
-    if val % 2 != 0:
-        #Ara recollim les 4 variables que torna la funció
-        azimuts, altures, llista_hores, off_h = corba_posicio(val, 1)
-        
         # Pintem els punts de les hores
         for (h_az, h_alt, h_text) in llista_hores:
             plt.plot(h_az, h_alt, 'yo', markersize=4, zorder=5)     
             plt.text(h_az, h_alt, h_text, fontsize=8, ha='center')    
-        
+
         # Pintem la línea de la trajectoria
         # utilitzem azimuts i altures directament, i off_h per la etiqueta
-        plt.plot(azimuts, altures, label=f'1 de {key}, Hora local (UTC+{off_h})', linewidth=2)
-
-plt.axhline(0, color='black', linewidth=1, linestyle='--', alpha=0.6)
-
-label_style = {'color': 'red', 'fontsize': 12, 'fontweight': 'bold', 'ha': 'center', 'va': 'top'}
-plt.text(90, -15 , 'E', **label_style)
-plt.text(180, -15 , 'S', **label_style)
-plt.text(270, -15 , 'O', **label_style)
-
-plt.xlabel("Azimut (Graus)", labelpad=15)
-plt.ylabel("Elevació (Graus)")
-plt.xticks(np.arange(0, 361, 20))
-plt.yticks(np.arange(-10, 91, 10))
-plt.xlim(0, 360)
-plt.ylim(-10, 90)
-
-plt.grid(True, linestyle=':', alpha=0.6)
-plt.legend(loc='upper right', framealpha=0.9, shadow=True)
-plt.tight_layout()
-plt.gca().tick_params(direction="in")
-plt.savefig(f'figures/trajectoriasolar.png', bbox_inches='tight')
\ No newline at end of file
+        plt.plot(azimuts, altures, label=f'{dia} de {key}, Hora local (UTC+{off_h})', linewidth=2)
+
+    plt.axhline(0, color='black', linewidth=1, linestyle='--', alpha=0.6)
+
+    label_style = {'color': 'red', 'fontsize': 12, 'fontweight': 'bold', 'ha': 'center', 'va': 'top'}
+    plt.text(90, -15 , 'E', **label_style)
+    plt.text(180, -15 , 'S', **label_style)
+    plt.text(270, -15 , 'O', **label_style)
+
+    plt.xlabel("Azimut (Graus)", labelpad=15)
+    plt.ylabel("Elevació (Graus)")
+    plt.xticks(np.arange(0, 361, 20))
+    plt.yticks(np.arange(-10, 91, 10))
+    plt.xlim(0, 360)
+    plt.ylim(-10, 90)
+
+    plt.grid(True, linestyle=':', alpha=0.6)
+    plt.legend(loc='upper right', framealpha=0.9, shadow=True)
+    plt.tight_layout()
+    plt.gca().tick_params(direction="in")
+    plt.savefig(fitxer, bbox_inches='tight')
+
+
+if __name__ == '__main__':
+    grafica_trajectoria_solar(corbes_posicio())
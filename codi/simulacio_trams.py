@@ -0,0 +1,121 @@
+import numpy as np
+from efemerides import EfemeridesTerra
+from zona_horaria import local_a_utc
+from llum_dia import coordenades_emplacament, sortida_posta, posiciosol_dia, usar_mascara_dia
+from calibracio import factor_atmosferic
+from perdues import temperatura_ambient
+from perfil_consum import _dia_any
+from optimitzacio_panells import perfil_generacio_unitari, escombrat_panells, CONSUM_ANUAL_LLAR
+
+# Simulació per trams d'un mes: cada etapa és un generador que rep els trams de
+# l'anterior, i al final només queden acumuladors. La memòria màxima és la d'un
+# mes, independentment del nombre d'anys i de la resolució.
+
+
+def trams_mensuals(any_inici=2026, anys=1):
+    '''Genera els dies (datetime64[D]) de cada mes, des de l'1 de gener de any_inici'''
+    mesos = np.arange(f'{any_inici}-01', f'{any_inici + anys}-01', dtype='datetime64[M]')
+    for mes in mesos:
+        yield np.arange(mes.astype('datetime64[D]'), (mes + 1).astype('datetime64[D]'))
+
+
+def geometria(trams, resolucio=10, emplacament=None, efemerides=None, nomes_dia=None):
+    '''Per a cada tram de dies, la posició del sol a la graella dia x instant local'''
+    if efemerides is None:
+        efemerides = EfemeridesTerra()
+    nomes_dia = usar_mascara_dia(nomes_dia, resolucio)
+    lat, lon, zona = coordenades_emplacament(emplacament)
+    minuts = np.arange(0, 24 * 60, resolucio)
+    for dies in trams:
+        dates_utc = local_a_utc(dies[:, None] + minuts.astype('timedelta64[m]'), zona)
+        llum = sortida_posta(dies, emplacament, efemerides) if nomes_dia else None
+        azimuts, altures = posiciosol_dia(efemerides.posicio, dates_utc, llum, lat, lon)
+        yield {'dies': dies, 'minuts': minuts, 'azimuts': azimuts, 'altures': altures}
+
+
+def potencia(trams, transmitancia=None, perdues=None, horitzo=None, inclinacio=0.0, azimut_panell=180.0):
+    '''Afegeix a cada tram la potència d'un panell (W) amb el mateix model que
+    perfil_generacio_unitari (atmosfera per mes, pèrdues amb la temperatura del
+    tram, horitzó)'''
+    for tram in trams:
+        factor = 1.0
+        if transmitancia is not None:
+            mesos = tram['dies'].astype('datetime64[M]').astype(int) % 12
+            factor = factor_atmosferic(tram['altures'], mesos[:, None], transmitancia)
+        temperatura = None if perdues is None else temperatura_ambient(tram['dies'], tram['minuts'])
+        tram['potencia'] = perfil_generacio_unitari(tram['altures'], tram['azimuts'], inclinacio, azimut_panell,
+                                                    factor, perdues, temperatura, horitzo).reshape(tram['altures'].shape)
+        yield tram
+
+
+def balanc(trams, llista_panells=range(1, 16), consums_anuals_kWh=CONSUM_ANUAL_LLAR, perfils_consum_W=None,
+           dt_h=10/60):
+    '''Redueix els trams a acumuladors: energia generada per panell, autoconsum,
+    excedent i consum (totals i per mes). L'autoconsum de cada tram el calcula
+    escombrat_panells, com al càlcul en memòria.
+    perfils_consum_W: array (C, 365, instants) com el de perfil_consum; si és None
+    el consum és constant a cada nivell de consums_anuals_kWh.
+    Retorna un diccionari d'arrays; els mensuals tenen un últim eix de mesos'''
+    mesos, generat, autoconsum, excedent, consum = [], [], [], [], []
+    for tram in trams:
+        g = tram['potencia'].ravel()
+        if perfils_consum_W is None:
+            resultat = escombrat_panells(g, llista_panells, consums_anuals_kWh, dt_h=dt_h)
+            consum_tram = resultat['consum_anual_kWh'] * g.size / (365 * 24 / dt_h)
+        else:
+            dia = _dia_any(tram['dies'])
+            # el 29 de febrer (-1) fa servir el perfil del 28
+            perfils = np.asarray(perfils_consum_W)[:, np.where(dia < 0, 58, dia)].reshape(len(perfils_consum_W), -1)
+            resultat = escombrat_panells(g, llista_panells, dt_h=dt_h, perfils_consum_W=perfils)
+            consum_tram = resultat['consum_anual_kWh']
+        mesos.append(tram['dies'][0].astype('datetime64[M]'))
+        generat.append(g.sum() * dt_h / 1000)
+        autoconsum.append(resultat['kwh_autoconsum'])
+        excedent.append(resultat['kwh_excedent'])
+        consum.append(consum_tram)
+        del tram # no guardem res més del tram
+
+    autoconsum_mensual = np.stack(autoconsum, axis=-1)
+    excedent_mensual = np.stack(excedent, axis=-1)
+    return {
+        'panells': np.asarray(llista_panells, dtype=int),
+        'mesos': np.array(mesos),
+        'kwh_panell_mensual': np.array(generat),
+        'kwh_autoconsum_mensual': autoconsum_mensual,
+        'kwh_excedent_mensual': excedent_mensual,
+        'kwh_consum_mensual': np.stack(consum, axis=-1),
+        'kwh_panell': float(np.sum(generat)),
+        'kwh_autoconsum': autoconsum_mensual.sum(axis=-1),
+        'kwh_excedent': excedent_mensual.sum(axis=-1),
+    }
+
+
+def simular_trams(any_inici=2026, anys=1, resolucio=10, llista_panells=range(1, 16),
+                  consums_anuals_kWh=CONSUM_ANUAL_LLAR, perfils_consum_W=None, transmitancia=None,
+                  perdues=None, horitzo=None, emplacament=None, efemerides=None):
+    '''Encadena trams_mensuals -> geometria -> potencia -> balanc.
+    Amb anys=1 dona el mateix que altures_any + perfil_generacio_unitari +
+    escombrat_panells (llevat de l'ordre de les sumes)'''
+    trams = trams_mensuals(any_inici, anys)
+    trams = geometria(trams, resolucio, emplacament, efemerides)
+    trams = potencia(trams, transmitancia, perdues, horitzo)
+    return balanc(trams, llista_panells, consums_anuals_kWh, perfils_consum_W, resolucio / 60)
+
+
+if __name__ == '__main__':
+    import time
+    import tracemalloc
+    from calibracio import calibrar
+    from perdues import CadenaPerdues
+
+    transmitancia = calibrar()['transmitancia']
+    for anys, resolucio in [(1, 10), (1, 1), (3, 1)]:
+        tracemalloc.start()
+        inici = time.perf_counter()
+        resultat = simular_trams(2026, anys, resolucio, transmitancia=transmitancia, perdues=CadenaPerdues())
+        temps = time.perf_counter() - inici
+        _, pic = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{anys} any(s) a {resolucio} min: {temps:5.1f} s, pic de memòria {pic / 2**20:6.1f} MB, "
+              f"{resultat['kwh_panell'] / anys:.1f} kWh/panell/any, "
+              f"autoconsum amb 15 panells {resultat['kwh_autoconsum'][-1, 0] / anys:.0f} kWh/any")
@@ -1,5 +1,9 @@
+import os
+import hashlib
 import numpy as np
-import matplotlib.pyplot as plt
+from integradors import (pas_verlet, pas_yoshida4, integrar_pas_fix, sortida_densa,
+                         integrar_adaptatiu, AVALUACIONS_PER_PAS)
+from instrumentacio import instrumentar
 
 # --- PARÀMETRES DEL PROBLEMA --- #
 #Condicions inicials
@@ -18,6 +22,15 @@ k = - (G*M_sol) / (v_per**2 * r_per)
 
 #Pas temporal
 h = 3600*24 * v_per/r_per
+DIA_ADIM = 3600*24 * v_per/r_per #un dia en temps adimensional
+
+#Mètodes disponibles: pas fix (rk4, verlet, yoshida4) o adaptatius amb control d'error
+METODES_PAS_FIX = ('rk4', 'verlet', 'yoshida4')
+METODES_ADAPTATIUS = ('RK45', 'DOP853')
+
+#Directori on guardem les òrbites ja integrades
+DIR_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cache')
+VERSIO_CACHE = 2 # canviar-la si canvia el que es desa (invalida les òrbites de disc)
 
 #Vector condicions inicials
 Y = np.array([theta_0,r_0,v_0])
@@ -34,7 +47,7 @@ def f(t,Y):
 
     return np.array([dtheta_dt, dr_dt, dv_dt])
 
-def pas_rk4(f,t,Y):
+def pas_rk4(f,t,Y,h=h):
     '''Aquesta funció fa 
     un pas de runge-Kutta 
     per una funció general'''
@@ -45,50 +58,166 @@ def pas_rk4(f,t,Y):
 
     return Y + h/6 * (k_1 + 2*k_2 + 2*k_3 + k_4)
 
-# --- ITERACIÓ RK4 --- #
-# Llistes de valors
-t = []
-theta = []
-r = []
-
-t_i = 0
-
-#Bucle
-while Y[0] < 2*np.pi:
-    t.append(t_i)
-    theta.append(Y[0])
-    r.append(Y[1])
-    Y = pas_rk4(f, t_i, Y)
-    t_i += h
-
-#Temps en dies
-t_i = t_i * (r_per/v_per)
-dies = t_i/(24*60*60)
-
-# Càlcul d'excentritat 
-r_max = np.max(r)
-r_min = np.min(r)
-
-e = (r_max - r_min)/(r_max+r_min)
-#Passem a coordenades cartesianes i unitats astronòmiques(UA)
-theta = np.array(theta)
-r = np.array(r) * r_per / UA
-
-x = r * np.cos(theta)
-y = r * np.sin(theta)
-
-# --- Gràfica ---
-plt.figure(figsize = (10,6))
-
-plt.scatter([0], [0], color='gold', s=200, label='Sol (Focus)') #Representem el sol al focus
-plt.scatter(x[0], y[0], color = 'forestgreen', s = 50, label = 'Terra al Periheli', zorder = 1) #Representarem també la terra al periheli
-
-plt.plot(x, y, label='Trajectòria de la Terra', color='deepskyblue', zorder = 0)
-
-plt.axis('equal') 
-plt.grid(True, linestyle='--', alpha=0.3)
-plt.xlabel('x (UA)')
-plt.ylabel('y (UA)')
-plt.legend(loc = 'upper left', fontsize = 10)
-plt.tight_layout()
-plt.savefig('figures/trajectoriaterra.png', bbox_inches='tight')
\ No newline at end of file
+def impuls(r):
+    '''Part de les edos que només depèn de r: dtheta/dt i dv/dt
+    (és el que necessiten els mètodes simplèctics, veure integradors)'''
+    return l/r**2, (l**2/r**3) + (k/r**2)
+
+def energia(Y):
+    '''Energia adimensional per unitat de massa de l'estat (theta, r, v)'''
+    theta, r, v = Y
+    return 0.5*v**2 + 0.5*(l/r)**2 + k/r
+
+@instrumentar()
+def orbita_densa(periodes=1, metode='DOP853', pas_dies=1.0, rtol=1e-10):
+    '''Integra des del periheli fins a completar exactament les voltes demanades.
+    Els mètodes de pas fix fan passos de pas_dies i s'interpolen amb Hermite;
+    els adaptatius trien el pas segons rtol i porten sortida densa pròpia.
+    L'instant final és on theta = 2*pi*periodes (sense passar-se'n).
+    Retorna (funció t_adim -> Y (3, ...), t_final_adim, avaluacions de f)'''
+    objectiu = 2*np.pi*periodes
+    if metode in METODES_ADAPTATIUS:
+        def volta(t, Y):
+            return Y[0] - objectiu
+        volta.terminal, volta.direction = True, 1
+        # marge ample: l'esdeveniment atura la integració a la volta exacta
+        sol = integrar_adaptatiu(f, Y, 1.1 * periodes * 366 * DIA_ADIM, metode,
+                                 rtol=rtol, atol=rtol*1e-2, esdeveniments=[volta])
+        return sol.sol, sol.t_events[0][0], sol.nfev
+
+    if metode == 'rk4':
+        pas = lambda Y_i, h_i: pas_rk4(f, 0, Y_i, h_i)
+    elif metode == 'verlet':
+        pas = lambda Y_i, h_i: pas_verlet(impuls, Y_i, h_i)
+    elif metode == 'yoshida4':
+        pas = lambda Y_i, h_i: pas_yoshida4(impuls, Y_i, h_i)
+    else:
+        raise ValueError(f"Mètode desconegut: {metode}")
+    t, Ys = integrar_pas_fix(pas, Y, pas_dies * DIA_ADIM, aturar=lambda Y_i: Y_i[0] >= objectiu)
+    densa = sortida_densa(t, Ys, f)
+    t_final = _instant_volta(t[-2:], Ys[-2:], objectiu)
+    avaluacions = (len(t) - 1) * AVALUACIONS_PER_PAS[metode] + len(t)
+    return densa, t_final, avaluacions
+
+def _instant_volta(t, Ys, objectiu):
+    # theta és monòtona: l'arrel de l'Hermite de theta entre els dos últims estats
+    # (abans i després de la volta) és l'instant exacte en què theta = objectiu
+    from scipy.interpolate import CubicHermiteSpline
+    dtheta = l / Ys[:, 1]**2
+    return CubicHermiteSpline(t, Ys[:, 0] - objectiu, dtheta).solve(0.0, extrapolate=False)[0]
+
+def _clau_cache(pas_dies, periodes, metode='rk4'):
+    # La clau inclou tots els paràmetres que afecten la integració
+    parametres = (VERSIO_CACHE, pas_dies, periodes, metode, r_0, v_0, theta_0, l, r_per, v_per, UA, G, M_sol)
+    return hashlib.sha1(repr(parametres).encode()).hexdigest()[:16]
+
+@instrumentar()
+def integrar_orbita(pas_dies=1.0, periodes=1, metode='rk4'):
+    '''Integra l'òrbita amb RK4 des del periheli fins
+    completar el nombre de voltes demanat (sense cache).
+    Amb un altre mètode (veure orbita_densa) mostregem la sortida densa cada
+    pas_dies fins a la volta exacta. En tots els casos afegim el període
+    ('periode', dies) a partir de l'instant exacte de la volta'''
+    if metode != 'rk4':
+        densa, t_final, _ = orbita_densa(periodes, metode, pas_dies)
+        t_adim = np.arange(0, t_final, pas_dies * DIA_ADIM)
+        theta, r, _ = densa(t_adim)
+        r = r * r_per / UA
+        return {'t': t_adim / DIA_ADIM, 'theta': theta, 'r': r,
+                'x': r * np.cos(theta), 'y': r * np.sin(theta),
+                'periode': np.float64(t_final / DIA_ADIM / periodes)}
+
+    h_adim = pas_dies * 3600*24 * v_per/r_per
+    Y = np.array([theta_0, r_0, v_0])
+
+    # Llistes de valors
+    t = []
+    theta = []
+    r = []
+
+    t_i = 0
+
+    #Bucle
+    while Y[0] < 2*np.pi*periodes:
+        t.append(t_i)
+        theta.append(Y[0])
+        r.append(Y[1])
+        Y_anterior = Y
+        Y = pas_rk4(f, t_i, Y, h_adim)
+        t_i += h_adim
+
+    #Instant exacte de la volta, entre l'últim pas i el següent
+    t_final = _instant_volta(np.array([t_i - h_adim, t_i]), np.array([Y_anterior, Y]), 2*np.pi*periodes)
+
+    #Temps en dies
+    t = np.array(t) * (r_per/v_per) / (24*60*60)
+
+    #Passem a coordenades cartesianes i unitats astronòmiques(UA)
+    theta = np.array(theta)
+    r = np.array(r) * r_per / UA
+
+    x = r * np.cos(theta)
+    y = r * np.sin(theta)
+
+    return {'t': t, 'theta': theta, 'r': r, 'x': x, 'y': y,
+            'periode': np.float64(t_final / DIA_ADIM / periodes)}
+
+def calcular_orbita(pas_dies=1.0, periodes=1, usar_cache=True, metode='rk4'):
+    '''Retorna un diccionari amb els arrays t (dies), theta, r (UA), x, y (UA)
+    i el període (dies).
+    El resultat es guarda en un .npz a DIR_CACHE i les crides següents
+    amb els mateixos paràmetres només el llegeixen'''
+    fitxer = os.path.join(DIR_CACHE, f'orbita_{_clau_cache(pas_dies, periodes, metode)}.npz')
+    if usar_cache and os.path.exists(fitxer):
+        with np.load(fitxer) as dades:
+            return {clau: dades[clau] for clau in dades.files}
+
+    orbita = integrar_orbita(pas_dies, periodes, metode)
+    if usar_cache:
+        os.makedirs(DIR_CACHE, exist_ok=True)
+        np.savez(fitxer, **orbita)
+    return orbita
+
+def excentricitat(r):
+    # Càlcul d'excentritat 
+    r_max = np.max(r)
+    r_min = np.min(r)
+    return (r_max - r_min)/(r_max+r_min)
+
+def grafica_orbita(orbita, fitxer='figures/trajectoriaterra.png'):
+    import matplotlib.pyplot as plt
+    x, y = orbita['x'], orbita['y']
+
+    # --- Gràfica ---
+    plt.figure(figsize = (10,6))
+
+    plt.scatter([0], [0], color='gold', s=200, label='Sol (Focus)') #Representem el sol al focus
+    plt.scatter(x[0], y[0], color = 'forestgreen', s = 50, label = 'Terra al Periheli', zorder = 1) #Representarem també la terra al periheli
+
+    plt.plot(x, y, label='Trajectòria de la Terra', color='deepskyblue', zorder = 0)
+
+    plt.axis('equal') 
+    plt.grid(True, linestyle='--', alpha=0.3)
+    plt.xlabel('x (UA)')
+    plt.ylabel('y (UA)')
+    plt.legend(loc = 'upper left', fontsize = 10)
+    plt.tight_layout()
+    plt.savefig(fitxer, bbox_inches='tight')
+
+
+if __name__ == '__main__':
+    orbita = calcular_orbita()
+    print(f"Període: {orbita['periode']:.4f} dies, excentricitat: {excentricitat(orbita['r']):.5f}")
+    grafica_orbita(orbita)
+
+    # Horitzó llarg (vida útil de la instal·lació): avaluacions de f i deriva d'energia
+    anys = 25
+    E0 = energia(Y)
+    print(f"\nIntegració de {anys} voltes:")
+    for metode, opcions in [('rk4', {}), ('verlet', {}), ('yoshida4', {}), ('yoshida4', {'pas_dies': 4.0}),
+                            ('RK45', {}), ('DOP853', {}), ('DOP853', {'rtol': 1e-13})]:
+        densa, t_final, avaluacions = orbita_densa(anys, metode, **opcions)
+        t_mostres = np.linspace(0, t_final, 20000)
+        error_E = np.max(np.abs(energia(densa(t_mostres)) / E0 - 1))
+        print(f"  {metode:9s} {str(opcions):18s} {avaluacions:8d} avaluacions, "
+              f"període {t_final / DIA_ADIM / anys:.4f} dies, error relatiu d'energia {error_E:.1e}")
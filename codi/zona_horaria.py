@@ -0,0 +1,90 @@
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+import numpy as np
+from instrumentacio import instrumentar
+
+ZONA_PER_DEFECTE = 'Europe/Madrid'
+
+
+def _offset_segons(zona, segons_epoch):
+    # Offset UTC (segons) de la zona en un instant donat en segons epoch
+    instant = datetime.datetime.fromtimestamp(segons_epoch, tz=ZoneInfo(zona))
+    return int(instant.utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=None)
+def transicions_any(zona, any_):
+    '''Canvis d'hora d'un any segons les regles de zoneinfo.
+    Retorna (offset_inicial, instants_utc, offsets_nous), tot en segons:
+    a partir de instants_utc[i] (epoch) l'offset passa a ser offsets_nous[i]'''
+    inici = int(datetime.datetime(any_, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+    final = int(datetime.datetime(any_ + 1, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+
+    # Mirem l'offset cada hora i refinem amb bisecció fins al segon on canvia
+    hores = range(inici, final + 1, 3600)
+    offsets = [_offset_segons(zona, t) for t in hores]
+    instants, nous = [], []
+    for i in range(1, len(offsets)):
+        if offsets[i] != offsets[i - 1]:
+            abans, despres = hores[i - 1], hores[i]
+            while despres - abans > 1:
+                mig = (abans + despres) // 2
+                if _offset_segons(zona, mig) == offsets[i - 1]:
+                    abans = mig
+                else:
+                    despres = mig
+            instants.append(despres)
+            nous.append(offsets[i])
+    return offsets[0], np.array(instants, dtype=np.int64), np.array(nous, dtype=np.int64)
+
+
+def _taula_transicions(zona, any_inici, any_final):
+    # Concatenem les transicions de tots els anys demanats
+    offset_inicial = transicions_any(zona, any_inici)[0]
+    instants, nous = [], []
+    for any_ in range(any_inici, any_final + 1):
+        _, instants_any, nous_any = transicions_any(zona, any_)
+        instants.append(instants_any)
+        nous.append(nous_any)
+    return offset_inicial, np.concatenate(instants), np.concatenate(nous)
+
+
+def _anys(hores):
+    anys = hores.astype('datetime64[Y]').astype(int) + 1970
+    return int(anys.min()), int(anys.max())
+
+
+@instrumentar()
+def local_a_utc(hores_locals, zona=ZONA_PER_DEFECTE):
+    '''Converteix un array (de qualsevol forma) de datetime64 en hora local (sense zona)
+    a datetime64 UTC, per a qualsevol any.
+    Les hores que no existeixen (salt de primavera) i les ambigües (tardor) es
+    resolen com zoneinfo amb fold=0: amb l'offset d'abans del canvi.'''
+    hores_locals = np.asarray(hores_locals, dtype='datetime64[s]')
+    # Un dia de marge per si el canvi d'any local i UTC no coincideix
+    any_inici, any_final = _anys(hores_locals)
+    offset_inicial, instants, nous = _taula_transicions(zona, any_inici - 1, any_final + 1)
+
+    # Una hora local L fa servir l'offset d'abans del canvi si L < T + max(offset_abans, offset_nou)
+    offsets = np.concatenate([[offset_inicial], nous])
+    llindars_locals = instants + np.maximum(offsets[:-1], offsets[1:])
+    segons_locals = hores_locals.astype(np.int64)
+    offset = offsets[np.searchsorted(llindars_locals, segons_locals, side='right')]
+    return (segons_locals - offset).astype('datetime64[s]')
+
+
+def utc_a_local(instants_utc, zona=ZONA_PER_DEFECTE):
+    '''Converteix un array de datetime64 UTC a hora local (sense zona)'''
+    instants_utc = np.asarray(instants_utc, dtype='datetime64[s]')
+    any_inici, any_final = _anys(instants_utc)
+    offset_inicial, instants, nous = _taula_transicions(zona, any_inici - 1, any_final + 1)
+    offsets = np.concatenate([[offset_inicial], nous])
+    segons = instants_utc.astype(np.int64)
+    return (segons + offsets[np.searchsorted(instants, segons, side='right')]).astype('datetime64[s]')
+
+
+def offset_hores(hores_locals, zona=ZONA_PER_DEFECTE):
+    '''Offset UTC (hores) en vigor a cada hora local de l'array'''
+    hores_locals = np.asarray(hores_locals, dtype='datetime64[s]')
+    return (hores_locals - local_a_utc(hores_locals, zona)) / np.timedelta64(1, 'h')
@@ -0,0 +1,252 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# Punt d'entrada únic: python solar_simulation.py run energy|optimize|sunpath|orbit|compare
+# Els mòduls de codi/ (i matplotlib/scipy) només s'importen quan una comanda els fa
+# servir; les figures es dibuixen amb Agg en processos a part mentre es calcula la resta.
+ARREL = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ARREL, 'codi'))
+os.environ['MPLBACKEND'] = 'Agg'
+
+
+# --- COMANDES --- #
+# Cada comanda retorna un diccionari amb 'resum' (escalars), 'taula' (columnes
+# de la mateixa llargada, per al CSV) i 'figures': (mòdul, funció, arguments, fitxer)
+
+def _energia(args):
+    import numpy as np
+    from calibracio import calibrar
+    from perdues import CadenaPerdues
+    from energiagenerada import simular_any
+    simulacio = simular_any(args.resolucio, args.panells, transmitancia=calibrar()['transmitancia'],
+                            perdues=CadenaPerdues())
+    energia_diaria_Wh = simulacio['energia_diaria_Wh']
+    return {
+        'resum': {'panells': args.panells, 'energia_anual_kWh': energia_diaria_Wh.sum() / 1000},
+        'taula': {'dia': np.arange(1, len(energia_diaria_Wh) + 1), 'energia_Wh': energia_diaria_Wh},
+        'figures': [('energiagenerada', 'grafica_energia', (energia_diaria_Wh,), 'energia.png')],
+    }
+
+
+def _optimitzacio(args):
+    from optimitzacio_panells import optimitzar
+    resultat = optimitzar(range(1, args.max_panells + 1), objectiu=args.objectiu)
+    i = resultat['idx_optim']
+    economia = resultat['economia']
+    return {
+        'resum': {
+            'panells_optim': resultat['panells'][i],
+            'benefici_net': resultat['benefici_net'][i],
+            'autoconsum_percent': resultat['autoconsum_percent'][i],
+            'van': economia['van'][i],
+            'tir': economia['tir'][i],
+            'retorn_descomptat_anys': economia['retorn_descomptat_anys'][i],
+            'lcoe': economia['lcoe'][i],
+        },
+        'taula': {
+            'panells': resultat['panells'],
+            'kwh_autoconsum': resultat['kwh_autoconsum'][:, 0],
+            'kwh_excedent': resultat['kwh_excedent'][:, 0],
+            'autoconsum_percent': resultat['autoconsum_percent'],
+            'benefici_net': resultat['benefici_net'],
+            **{clau: economia[clau] for clau in ('van', 'tir', 'retorn_descomptat_anys', 'lcoe')},
+        },
+        'figures': [('optimitzacio_panells', 'grafica_optimitzacio',
+                     ({clau: resultat[clau] for clau in ('panells', 'van', 'autoconsum_percent',
+                                                         'idx_optim')},),
+                     'optimitzacio_panells.png')],
+    }
+
+
+def _trajectoria_solar(args):
+    from posiciosolcardedeu import corbes_posicio
+    corbes = corbes_posicio(args.dia)
+    taula = {'mes': [], 'azimut': [], 'altura': []}
+    for mes, (azimuts, altures, _, _) in corbes.items():
+        taula['mes'] += [mes] * len(azimuts)
+        taula['azimut'] += azimuts
+        taula['altura'] += altures
+    return {
+        'resum': {f'altura_maxima_{mes}': max(altures) for mes, (_, altures, _, _) in corbes.items()},
+        'taula': taula,
+        'figures': [('posiciosolcardedeu', 'grafica_trajectoria_solar', (corbes,), 'trajectoriasolar.png')],
+    }
+
+
+def _orbita(args):
+    from trajectoria import calcular_orbita, excentricitat
+    orbita = calcular_orbita(args.pas_dies, metode=args.metode)
+    return {
+        'resum': {'metode': args.metode, 'periode_dies': orbita['periode'], 'excentricitat': excentricitat(orbita['r'])},
+        'taula': {clau: orbita[clau] for clau in ('t', 'theta', 'r', 'x', 'y')},
+        'figures': [('trajectoria', 'grafica_orbita', (orbita,), 'trajectoriaterra.png')],
+    }
+
+
+def _comparativa(args):
+    import numpy as np
+    from comparativa_metodes import trajectories, convergencia, METODES, PAS_MAXIM
+    resultat = convergencia(args.dies, np.logspace(np.log10(args.pas_minim), np.log10(PAS_MAXIM), args.passos))
+    figures = [('comparativa_metodes', 'grafica_convergencia', (resultat,), 'convergencia_metodes.png')]
+    if not args.no_plots:
+        figures.append(('comparativa_metodes', 'grafica_comparativa', (trajectories(args.dies),),
+                        'comparativa_error_metodes.png'))
+    return {
+        'resum': {f'ordre_{nom}': ordre for nom, ordre in zip(METODES, resultat['ordres'])},
+        'taula': {'pas_s': resultat['passos_segons'],
+                  **{f'error_{nom}': errors for nom, errors in zip(METODES, resultat['errors'])}},
+        'figures': figures,
+    }
+
+
+COMANDES = {
+    'energy': _energia,
+    'optimize': _optimitzacio,
+    'sunpath': _trajectoria_solar,
+    'orbit': _orbita,
+    'compare': _comparativa,
+}
+
+
+def _dia_corbes(valor):
+    # --dia ha d'existir a tots els mesos de les corbes de sunpath
+    import calendar
+    from posiciosolcardedeu import MESOS_CORBES
+    dia = int(valor)
+    maxim = min(calendar.monthrange(2026, mes)[1] for mes in MESOS_CORBES.values())
+    if not 1 <= dia <= maxim:
+        raise argparse.ArgumentTypeError(f"ha de ser entre 1 i {maxim} (mesos: {', '.join(MESOS_CORBES)})")
+    return dia
+
+
+def _resolucio(valor):
+    # --resolucio: minuts entre mostres, com accepta energiagenerada.simular_any
+    resolucio = int(valor)
+    if not 1 <= resolucio <= 60 or 1440 % resolucio != 0:
+        raise argparse.ArgumentTypeError("ha de ser un divisor de 1440 entre 1 i 60 minuts")
+    return resolucio
+
+
+# --- SORTIDA --- #
+
+def _a_json(valor):
+    # arrays i escalars de numpy a tipus de Python; NaN i infinits a null
+    if hasattr(valor, 'tolist'):
+        valor = valor.tolist()
+    if isinstance(valor, dict):
+        return {clau: _a_json(v) for clau, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_a_json(v) for v in valor]
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    return valor
+
+
+def _escriure_csv(taula, f):
+    escriptor = csv.writer(f, lineterminator='\n')
+    escriptor.writerow(taula)
+    escriptor.writerows(zip(*(_a_json(columna) for columna in taula.values())))
+
+
+def escriure_resultats(resultats, format_, sortida=None):
+    '''Resultats numèrics en JSON o CSV: a stdout, o un fitxer per comanda al directori sortida'''
+    if sortida is not None:
+        os.makedirs(sortida, exist_ok=True)
+        for comanda, resultat in resultats.items():
+            with open(os.path.join(sortida, f'{comanda}.{format_}'), 'w', newline='', encoding='utf-8') as f:
+                if format_ == 'json':
+                    json.dump(_a_json({clau: resultat[clau] for clau in ('resum', 'taula')}), f, ensure_ascii=False)
+                else:
+                    _escriure_csv(resultat['taula'], f)
+    elif format_ == 'json':
+        json.dump(_a_json({comanda: {clau: resultat[clau] for clau in ('resum', 'taula')}
+                           for comanda, resultat in resultats.items()}), sys.stdout, ensure_ascii=False)
+        sys.stdout.write('\n')
+    else:
+        for comanda, resultat in resultats.items():
+            sys.stdout.write(f'# {comanda}\n')
+            _escriure_csv(resultat['taula'], sys.stdout)
+
+
+def _dibuixar(modul, funcio, arguments, fitxer):
+    # S'executa en un procés a part: importa el mòdul de la figura i la desa
+    import importlib
+    import matplotlib.pyplot as plt
+    getattr(importlib.import_module(modul), funcio)(*arguments, fitxer=fitxer)
+    plt.close('all')
+    return fitxer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='solar', description="Simulació de la instal·lació solar de Cardedeu")
+    subparsers = parser.add_subparsers(dest='accio', required=True)
+    run = subparsers.add_parser('run', help="executa una o més comandes")
+    run.add_argument('comandes', nargs='+', choices=[*COMANDES, 'all'])
+    run.add_argument('--no-plots', action='store_true', help="només càlcul: resultats en JSON o CSV")
+    run.add_argument('--format', choices=['json', 'csv'], default='json')
+    run.add_argument('--sortida', help="directori per als resultats (per defecte, stdout)")
+    run.add_argument('--figures', default=os.path.join(ARREL, 'figures'), help="directori de les figures")
+    run.add_argument('--processos', type=int, default=None, help="processos per dibuixar les figures")
+    run.add_argument('--perfil', action='store_true', help="temps per etapa (veure codi/instrumentacio.py)")
+    run.add_argument('--perfil-json', default='perfil_execucio.json', help="--perfil: fitxer del perfil en JSON")
+    run.add_argument('--resolucio', type=_resolucio, default=10, help="energy: minuts entre mostres")
+    run.add_argument('--panells', type=int, default=4, help="energy: nombre de panells")
+    run.add_argument('--max-panells', type=int, default=15, help="optimize: es proven d'1 a max-panells")
+    run.add_argument('--objectiu', choices=['van', 'benefici_net'], default='van',
+                     help="optimize: criteri de l'òptim (VAN o benefici sense descompte)")
+    run.add_argument('--dia', type=_dia_corbes, default=1, help="sunpath: dia del mes de les corbes")
+    run.add_argument('--pas-dies', type=float, default=1.0, help="orbit: pas d'integració")
+    run.add_argument('--metode', choices=('rk4', 'verlet', 'yoshida4', 'RK45', 'DOP853'), default='rk4',
+                     help="orbit: mètode d'integració")
+    run.add_argument('--dies', type=int, default=400, help="compare: dies simulats")
+    run.add_argument('--passos', type=int, default=21, help="compare: passos de l'estudi de convergència")
+    run.add_argument('--pas-minim', type=float, default=1e3,
+                     help="compare: pas més fi en segons (1e2 afina l'estudi però triga ~10 vegades més)")
+    args = parser.parse_args(argv)
+
+    comandes = list(COMANDES) if 'all' in args.comandes else list(dict.fromkeys(args.comandes))
+    if args.perfil:
+        import instrumentacio
+        instrumentacio.activar()
+
+    resultats = {}
+    executor = None
+    pendents = []
+    if not args.no_plots:
+        os.makedirs(args.figures, exist_ok=True)
+        executor = ProcessPoolExecutor(max_workers=args.processos)
+    try:
+        for comanda in comandes:
+            inici = time.perf_counter()
+            resultats[comanda] = COMANDES[comanda](args)
+            temps = time.perf_counter() - inici
+            if executor is None:
+                continue
+            # Les figures d'aquesta comanda es dibuixen mentre calculem la següent
+            for modul, funcio, arguments, fitxer in resultats[comanda]['figures']:
+                pendents.append(executor.submit(_dibuixar, modul, funcio, arguments,
+                                                os.path.join(args.figures, fitxer)))
+            print(f"[{comanda}] {temps:.1f} s")
+            for clau, valor in resultats[comanda]['resum'].items():
+                print(f"  {clau}: {valor:.4g}" if isinstance(valor, float) else f"  {clau}: {valor}")
+        for pendent in pendents:
+            print(f"Figura desada: {pendent.result()}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if args.no_plots or args.sortida:
+        escriure_resultats(resultats, args.format, args.sortida)
+    if args.perfil:
+        print(instrumentacio.resum(), file=sys.stderr)
+        instrumentacio.desar_json(args.perfil_json, {'comandes': comandes})
+
+
+if __name__ == '__main__':
+    main()